@@ -0,0 +1,45 @@
+import numpy as np
+from apostolyuk import get_lift_coeff, get_drag_coeff
+
+
+class CoefficientTable:
+    # Periodic coefficient curve over the angle of attack, sampled once on a uniform grid over [-pi, pi)
+    # and evaluated by linear interpolation. Accepts scalars or arrays of angles.
+    def __init__(self, function, samples=1024):
+        self.samples = samples
+        self.step = 2 * np.pi / samples
+        angles = -np.pi + np.arange(samples) * self.step
+        values = np.asarray(function(angles), dtype=float)
+        self.values = np.append(values, values[0])  # wraps around at pi
+
+    def __call__(self, angle_of_attack):
+        position = np.mod(np.asarray(angle_of_attack, dtype=float) + np.pi, 2 * np.pi) / self.step
+        index = np.minimum(position.astype(int), self.samples - 1)
+        fraction = position - index
+        return self.values[index] * (1 - fraction) + self.values[index + 1] * fraction
+
+
+_tables = {}
+
+def get_table(function, parameters=None, samples=1024):
+    # tables are shared by every component using the same curve
+    key = (function, None if parameters is None else tuple(parameters), samples)
+    if key not in _tables:
+        _tables[key] = CoefficientTable(function if parameters is None else lambda angles: function(angles, parameters), samples)
+    return _tables[key]
+
+def get_lift_table(parameters=None, samples=1024):
+    return get_table(get_lift_coeff, parameters, samples)
+
+def get_drag_table(parameters=None, samples=1024):
+    return get_table(get_drag_coeff, parameters, samples)
+
+
+if '__main__' == __name__:
+    import time
+    table = get_lift_table()
+    angles = np.random.default_rng(0).uniform(-10, 10, 100000)
+    print('max error: {:.2e}'.format(np.max(np.abs(table(angles) - get_lift_coeff(angles)))))
+    start = time.perf_counter()
+    table(angles)
+    print('{:.1f} ns per angle'.format((time.perf_counter() - start) / len(angles) * 1e9))
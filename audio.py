@@ -0,0 +1,60 @@
+import pygame
+
+
+class SoundBank:
+    # Decodes every sound file once per process and hands out the shared pygame.mixer.Sound.
+    def __init__(self):
+        self.sounds = {}
+
+    def get(self, path):
+        if path not in self.sounds:
+            self.sounds[path] = pygame.mixer.Sound(path)
+        return self.sounds[path]
+
+
+sound_bank = SoundBank()
+
+
+class ChannelPool:
+    # Plays the sounds of the max_channels highest priority sources. Priority is the volume of a source
+    # divided by its distance to the camera in window widths, so loud and near thrusters win. Sources
+    # keep their channel as long as they stay in the top max_channels, so their sound is not restarted.
+    def __init__(self, max_channels=8, bank=sound_bank):
+        self.max_channels = max_channels
+        self.bank = bank
+        pygame.mixer.set_num_channels(max_channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(max_channels)]
+        self.assigned = {}  # component -> channel
+
+    def get_priority(self, simulator, component, volume):
+        distance = (component.get_global_position() - simulator.camera_center).norm() * simulator.scale / simulator.window_size[0]
+        return volume / (1 + distance)
+
+    def update(self, simulator, entities=None):
+        # entities are the simulated ones by default
+        sources = []
+        for entity in simulator.entities if entities is None else entities:
+            for component in entity.components:
+                if component.sound_path:
+                    volume = component.get_sound_volume()
+                    if volume > 0:
+                        sources.append((self.get_priority(simulator, component, volume), volume, component))
+        sources.sort(key=lambda source: -source[0])
+        sources = sources[:self.max_channels]
+
+        playing = {component for _, _, component in sources}
+        for component in list(self.assigned):
+            if component not in playing:
+                self.assigned.pop(component).stop()
+        free = [channel for channel in self.channels if channel not in self.assigned.values()]
+        for _, volume, component in sources:
+            channel = self.assigned.get(component)
+            if channel is None:
+                channel = self.assigned[component] = free.pop()
+                channel.play(self.bank.get(component.sound_path), loops=-1)
+            channel.set_volume(volume)
+
+    def stop(self):
+        for channel in self.assigned.values():
+            channel.stop()
+        self.assigned = {}
@@ -0,0 +1,156 @@
+import numpy as np
+from component_base import GRAVITATIONAL_CONSTANT
+
+
+def _spread_bits(values):
+    # inserts a zero bit above every bit of 16 bit integers, for Morton codes
+    values = values.astype(np.uint64)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x33333333)
+    values = (values | (values << np.uint64(1))) & np.uint64(0x55555555)
+    return values
+
+
+def _point_mass_acceleration(d_position, mass):
+    # same scaling and softening as the direct solver
+    distance_squared = d_position[:, 0]**2 + d_position[:, 1]**2
+    magnitude = GRAVITATIONAL_CONSTANT * mass / np.maximum(distance_squared, 1)
+    return d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[:, None]
+
+
+class BarnesHut:
+    # Quadtree gravity, rebuilt for every evaluation. Nodes store the total mass, center of mass and
+    # the range of entity ranks of the components below them. A node is approximated by its center
+    # of mass if the target is farther than size / theta plus the offset of the center of mass from the
+    # center of the node, and the node cannot contain a component of the target's own entity, so
+    # theta=0 evaluates every pair exactly like the direct solver. Nodes with up to leaf_size
+    # components are leaves and evaluated component by component when they are not approximated. Entities
+    # are ranked by their first component in Morton order, which keeps the rank ranges of nodes
+    # tight because components of an entity lie close together.
+    def __init__(self, theta=0.5, leaf_size=8, max_depth=16, chunk_size=256):
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.max_depth = max_depth
+        self.chunk_size = chunk_size  # targets walked at once, bounds the memory of the frontier
+
+    def build(self, positions, masses, entity_index):
+        lower = positions.min(axis=0)
+        size = max(np.max(positions.max(axis=0) - lower), 1e-9) * (1 + 1e-9)
+        cells = 2 ** self.max_depth
+        quantized = np.clip(((positions - lower) / size * cells).astype(np.int64), 0, cells - 1)
+        codes = _spread_bits(quantized[:, 0]) | (_spread_bits(quantized[:, 1]) << np.uint64(1))
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        self.points = positions[order]
+        self.point_masses = masses[order]
+        self.entity_rank = np.full(np.max(entity_index) + 1, len(order))
+        np.minimum.at(self.entity_rank, entity_index[order], np.arange(len(order)))
+        self.point_entities = self.entity_rank[entity_index[order]]
+
+        # nodes level by level, every level lists the start of its nodes in the sorted points
+        weighted = self.points * self.point_masses[:, None]
+        starts, ends, node_masses, centers, offsets_from_center, entity_min, entity_max, sizes = [], [], [], [], [], [], [], []
+        for level in range(self.max_depth + 1):
+            keys = codes >> np.uint64(2 * (self.max_depth - level))
+            start = np.flatnonzero(np.concatenate(((True,), keys[1:] != keys[:-1])))
+            end = np.append(start[1:], len(codes))
+            mass = np.add.reduceat(self.point_masses, start)
+            center = np.add.reduceat(weighted, start) / mass[:, None]
+            node_size = size / 2 ** level
+            cell_center = lower + ((quantized[order[start]] >> (self.max_depth - level)) + 0.5) * node_size
+            starts.append(start)
+            ends.append(end)
+            node_masses.append(mass)
+            centers.append(center)
+            offsets_from_center.append(np.sqrt(np.sum((center - cell_center)**2, axis=1)))
+            entity_min.append(np.minimum.reduceat(self.point_entities, start))
+            entity_max.append(np.maximum.reduceat(self.point_entities, start))
+            sizes.append(np.full(len(start), node_size))
+            if np.all(end - start <= self.leaf_size):
+                break
+
+        offsets = np.cumsum([0] + [len(start) for start in starts])
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.mass = np.concatenate(node_masses)
+        self.center = np.concatenate(centers)
+        self.entity_min = np.concatenate(entity_min)
+        self.entity_max = np.concatenate(entity_max)
+        self.size = np.concatenate(sizes)
+        self.offset_from_center = np.concatenate(offsets_from_center)
+        self.is_leaf = self.end - self.start <= self.leaf_size
+        self.child_first = np.zeros(len(self.start), dtype=int)
+        self.child_end = np.zeros(len(self.start), dtype=int)
+        for level in range(len(starts) - 1):
+            nodes = slice(offsets[level], offsets[level + 1])
+            self.child_first[nodes] = offsets[level + 1] + np.searchsorted(starts[level + 1], starts[level])
+            self.child_end[nodes] = offsets[level + 1] + np.searchsorted(starts[level + 1], ends[level])
+        self.is_leaf[offsets[-2]:] = True  # deepest level, coincident points are evaluated one by one
+
+    def compute_accelerations(self, positions, entity_index):
+        # gravitational acceleration at positions of shape (n, 2) of components of entities entity_index
+        entity_rank = np.where(entity_index < len(self.entity_rank),
+                               self.entity_rank[np.minimum(entity_index, len(self.entity_rank) - 1)], len(self.points))
+        return np.concatenate([self._walk(positions[k:k + self.chunk_size], entity_rank[k:k + self.chunk_size])
+                               for k in range(0, len(positions), self.chunk_size)]).reshape(-1, 2)
+
+    def _walk(self, positions, entity_index):
+        n = len(positions)
+        accelerations = np.zeros((n, 2))
+
+        def accumulate(targets, d_position, mass):
+            acceleration = _point_mass_acceleration(d_position, mass)
+            accelerations[:, 0] += np.bincount(targets, acceleration[:, 0], minlength=n)
+            accelerations[:, 1] += np.bincount(targets, acceleration[:, 1], minlength=n)
+
+        targets = np.arange(n)
+        nodes = np.zeros(n, dtype=int)
+        while len(targets):
+            own = (self.entity_min[nodes] == entity_index[targets]) & (self.entity_max[nodes] == entity_index[targets])
+            targets, nodes = targets[~own], nodes[~own]  # nothing but the target's own entity below the node
+
+            d_position = self.center[nodes] - positions[targets]
+            distance = np.sqrt(d_position[:, 0]**2 + d_position[:, 1]**2)
+            far = (self.size[nodes] + self.theta * self.offset_from_center[nodes] < self.theta * distance) \
+                  & ((self.entity_min[nodes] > entity_index[targets]) | (self.entity_max[nodes] < entity_index[targets]))
+            accumulate(targets[far], d_position[far], self.mass[nodes[far]])
+
+            leaf = ~far & self.is_leaf[nodes]
+            counts = self.end[nodes[leaf]] - self.start[nodes[leaf]]
+            point_targets = np.repeat(targets[leaf], counts)
+            points = np.repeat(self.start[nodes[leaf]], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            other = self.point_entities[points] != entity_index[point_targets]
+            point_targets, points = point_targets[other], points[other]
+            accumulate(point_targets, self.points[points] - positions[point_targets], self.point_masses[points])
+
+            inner = ~far & ~self.is_leaf[nodes]
+            counts = self.child_end[nodes[inner]] - self.child_first[nodes[inner]]
+            targets = np.repeat(targets[inner], counts)
+            nodes = np.repeat(self.child_first[nodes[inner]], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return accelerations
+
+
+if '__main__' == __name__:
+    import time
+    rng = np.random.default_rng(0)
+    for n in (1000, 10000):
+        positions = rng.normal(0, 1000, (n, 2))
+        masses = rng.uniform(1e3, 1e5, n)
+        entity_index = np.arange(n)
+        # direct reference on at most 1000 targets
+        sample = rng.choice(n, min(n, 1000), replace=False)
+        d_position = positions[None, :, :] - positions[sample, None, :]
+        distance_squared = np.sum(d_position**2, axis=2)
+        magnitude = GRAVITATIONAL_CONSTANT * masses[None, :] / np.maximum(distance_squared, 1)
+        magnitude[np.arange(len(sample)), sample] = 0
+        direct = np.sum(d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[:, :, None], axis=1)
+        for theta in ((0, 0.3, 0.7) if n <= 1000 else (0.3, 0.7)):
+            solver = BarnesHut(theta)
+            start = time.perf_counter()
+            solver.build(positions, masses, entity_index)
+            accelerations = solver.compute_accelerations(positions, entity_index)
+            elapsed = time.perf_counter() - start
+            error = np.linalg.norm(accelerations[sample] - direct, axis=1) / np.linalg.norm(direct, axis=1)
+            print('n={:6d} theta={:.1f}: {:7.1f} ms, median/max relative error {:.1e}/{:.1e}'.format(
+                n, theta, elapsed * 1000, np.median(error), np.max(error)))
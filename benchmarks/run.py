@@ -0,0 +1,129 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+from benchmarks.scenes import SCENES, build_scene
+
+# Usage from the repository root:
+#   python -m benchmarks.run --save baseline.json
+#   python -m benchmarks.run --compare baseline.json
+# Throughput metrics are higher-is-better, memory and allocation metrics lower-is-better.
+
+HIGHER_IS_BETTER = ('steps_per_second', 'frames_per_second')
+LOWER_IS_BETTER = ('peak_memory_kb', 'transient_kb_per_step', 'allocated_blocks_per_step')
+
+
+def measure_steps(name, steps, time_step, warmup=10):
+    simulator = build_scene(name)
+    for _ in range(warmup):
+        simulator.step(time_step)
+    start = time.perf_counter()
+    for _ in range(steps):
+        simulator.step(time_step)
+    return steps / (time.perf_counter() - start)
+
+def measure_frames(name, frames, window_size, warmup=3):
+    simulator = build_scene(name, window_size=window_size, scale_init=10)
+    pygame.display.init()
+    simulator.window = pygame.display.set_mode(window_size)
+    if simulator.tracked_entity:
+        simulator.camera_center = simulator.tracked_entity.position_of_center_of_gravity.copy()
+    simulator.step(0.01)
+    for _ in range(warmup):
+        simulator.draw()
+    start = time.perf_counter()
+    for _ in range(frames):
+        simulator.draw()
+    return frames / (time.perf_counter() - start)
+
+def measure_memory(name, steps, time_step):
+    simulator = build_scene(name)
+    simulator.step(time_step)
+    tracemalloc.start()
+    transient = 0
+    blocks_start = sys.getallocatedblocks()
+    for _ in range(steps):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        simulator.step(time_step)
+        transient += tracemalloc.get_traced_memory()[1] - current
+    blocks_end = sys.getallocatedblocks()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(peak_memory_kb=peak / 1024,
+                transient_kb_per_step=transient / steps / 1024,
+                allocated_blocks_per_step=(blocks_end - blocks_start) / steps)
+
+def run_benchmarks(scenes, steps=200, frames=100, time_step=0.01, window_size=(800, 600)):
+    results = {}
+    for name in scenes:
+        result = dict(steps_per_second=measure_steps(name, steps, time_step),
+                      frames_per_second=measure_frames(name, frames, window_size))
+        result.update(measure_memory(name, max(steps // 4, 1), time_step))
+        results[name] = result
+        print('{:<20} {:>10.1f} steps/s {:>10.1f} frames/s {:>10.1f} kB peak'.format(
+            name, result['steps_per_second'], result['frames_per_second'], result['peak_memory_kb']))
+    return results
+
+def get_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return dict(commit=commit, date=datetime.datetime.now().isoformat(timespec='seconds'),
+                python=platform.python_version(), numpy=np.__version__, pygame=pygame.version.ver,
+                machine=platform.machine(), processor=platform.processor())
+
+def compare(results, baseline, threshold=0.1):
+    # prints relative changes and returns the regressions beyond threshold
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline['results']:
+            continue
+        for metric, value in result.items():
+            reference = baseline['results'][name].get(metric)
+            if not reference:
+                continue
+            change = value / reference - 1
+            regressed = (metric in HIGHER_IS_BETTER and change < -threshold) \
+                or (metric in LOWER_IS_BETTER and change > threshold)
+            print('{:<20} {:<28} {:>12.2f} -> {:>12.2f} {:>+8.1%}{}'.format(
+                name, metric, reference, value, change, '  REGRESSION' if regressed else ''))
+            if regressed:
+                regressions.append((name, metric, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='physics and rendering throughput benchmarks')
+    parser.add_argument('--scenes', nargs='*', default=list(SCENES), choices=list(SCENES))
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--save', help='write results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to diff against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scenes, steps=args.steps, frames=args.frames)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(dict(metadata=get_metadata(), results=results), file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if '__main__' == __name__:
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import numpy as np
+from simulator import Simulator
+from entity_library import *
+
+# Canonical benchmark scenes. Every scene is built from a fixed seed so runs are comparable between commits.
+
+
+def _rocket(position, orientation=np.pi, throttle=0.5):
+    return Rocket(position_init=position, orientation_init=orientation,
+                  mass=100, max_thrust=250, max_thrust_thrusters=100,
+                  height=2, diameter=0.3, rel_height_pressure_center=0.2,
+                  throttle_fn=lambda: throttle)
+
+def home_planet_scene(simulator):
+    # main.py: home planet, four random planets and one rocket
+    simulator.add_entity(Planet(position_init=Vector(0, 100), radius=100, density=5, color=(0, 255, 0),
+                                athmosphere_radius=200, athmosphere_density=1, athmosphere_color=(100, 100, 255), max_wind=0))
+    for planet_parameters in random_planet_parameters(simulator.rng, count=4, spread=1000,
+                                                      positions=[entity.position_of_center_of_gravity for entity in simulator.entities]):
+        simulator.add_entity(Planet(**planet_parameters))
+    simulator.add_entity(rocket := _rocket(Vector(0, -3)))
+    simulator.track(rocket)
+
+def planet_field_scene(simulator, count=100):
+    # planets are placed clear of the rocket, which must start outside all of them
+    for planet_parameters in random_planet_parameters(simulator.rng, count=count, spread=5000, positions=[Vector(0, 0)]):
+        simulator.add_entity(Planet(**planet_parameters))
+    simulator.add_entity(rocket := _rocket(Vector(0, 0)))
+    simulator.track(rocket)
+    assert all(rocket.get_distance_to(planet) > planet.get_bounding_radius() + rocket.get_bounding_radius()
+               for planet in simulator.static_entities), 'rocket starts inside a planet'
+
+def rockets_scene(simulator, count=1):
+    simulator.add_entity(Planet(position_init=Vector(0, 100), radius=100, density=5,
+                                athmosphere_radius=200, max_wind=5))
+    for i in range(count):
+        simulator.add_entity(rocket := _rocket(Vector((i - count / 2) * 3, -10)))
+    simulator.track(rocket)
+
+def landing_scene(simulator):
+    # rocket resting on its legs on the home planet
+    simulator.add_entity(Planet(position_init=Vector(0, 100), radius=100, density=5, athmosphere_radius=200))
+    simulator.add_entity(rocket := _rocket(Vector(0, -1.5), throttle=0))
+    simulator.track(rocket)
+
+SCENES = {
+    'home_planet': home_planet_scene,
+    'planet_field_100': lambda simulator: planet_field_scene(simulator, 100),
+    'rockets_1': lambda simulator: rockets_scene(simulator, 1),
+    'rockets_10': lambda simulator: rockets_scene(simulator, 10),
+    'rockets_100': lambda simulator: rockets_scene(simulator, 100),
+    'landing': landing_scene,
+}
+
+def build_scene(name, seed=0, **simulator_kwargs):
+    simulator = Simulator(headless=True, seed=seed, **simulator_kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):  # entities print on creation
+        SCENES[name](simulator)
+    return simulator
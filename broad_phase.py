@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class SweepAndPrune:
+    # Sweep-and-prune over bounding circles. The sort order along x is kept between steps, so
+    # re-sorting the nearly sorted intervals each step is close to linear in the number of bodies.
+    def __init__(self):
+        self._order = np.zeros(0, dtype=int)
+
+    def find_pairs(self, positions, radii):
+        # returns index arrays (i, j) of all pairs whose bounding boxes overlap
+        n = len(radii)
+        lower = positions[:, 0] - radii
+        upper = positions[:, 0] + radii
+
+        if len(self._order) != n:
+            self._order = np.arange(n)
+        self._order = self._order[np.argsort(lower[self._order], kind='stable')]
+        order = self._order
+        lower_sorted = lower[order]
+        upper_sorted = upper[order]
+
+        # every interval overlaps the following ones that start before it ends
+        end = np.searchsorted(lower_sorted, upper_sorted, side='right')
+        counts = end - np.arange(n) - 1
+        first = np.repeat(np.arange(n), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        i = order[first]
+        j = order[first + 1 + offsets]
+
+        # prune along y
+        overlap = np.abs(positions[i, 1] - positions[j, 1]) <= radii[i] + radii[j]
+        return i[overlap], j[overlap]
+
+
+if __name__ == '__main__':
+    positions = np.random.rand(1000, 2) * 1000
+    radii = np.random.rand(1000) * 5
+    i, j = SweepAndPrune().find_pairs(positions, radii)
+    distance = np.sqrt(np.sum((positions[:, None] - positions[None]) ** 2, axis=2))
+    brute_force = np.sum(np.triu(distance < radii[:, None] + radii[None], 1))
+    print('{} candidate pairs, {} overlapping pairs'.format(len(i), brute_force))
@@ -0,0 +1,112 @@
+import math
+from collections import OrderedDict
+import numpy as np
+import pygame
+
+
+class CircleRenderer:
+    # Draws filled circles in window pixels. Circles much larger than the window are reduced to the
+    # visible segment, clipped to the window. Medium circles are blitted from pre-rendered surfaces
+    # kept in an LRU cache keyed by body radius, scale bucket and color, buckets_per_octave buckets
+    # per doubling of the scale. While the scale changes within a bucket, the circle is drawn
+    # directly; the surface of the bucket is re-rendered once the pixel radius has been the same for
+    # settle_draws draws, so continuous zoom neither allocates surfaces nor churns the cache.
+    def __init__(self, min_cached_radius=8, max_cached_radius=256, max_entries=32, clip_factor=2, arc_points=64,
+                 buckets_per_octave=4, settle_draws=30):
+        self.min_cached_radius = min_cached_radius
+        self.max_cached_radius = max_cached_radius
+        self.max_entries = max_entries
+        self.clip_factor = clip_factor
+        self.arc_points = arc_points
+        self.buckets_per_octave = buckets_per_octave
+        self.settle_draws = settle_draws
+        self.cache = OrderedDict()  # key: [surface, its pixel radius, pixel radius last drawn, draws since it changed]
+
+    def draw(self, surface, color, center, radius, scale=1):
+        # radius in physical units, scale in pixels per unit
+        pixel_radius = radius * scale
+        width, height = surface.get_size()
+        if pixel_radius > self.clip_factor * max(width, height):
+            self._draw_clipped(surface, color, center, pixel_radius)
+        elif self.min_cached_radius <= pixel_radius <= self.max_cached_radius:
+            self._draw_cached(surface, color, center, radius, scale)
+        else:
+            pygame.draw.circle(surface, color=color, center=center, radius=pixel_radius)
+
+    def get_bucket(self, scale):
+        return round(math.log2(scale) * self.buckets_per_octave)
+
+    def _get_entry(self, color, radius, scale):
+        key = (radius, self.get_bucket(scale), tuple(color))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        entry = self.cache[key] = [None, None, None, 0]
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _render(color, pixel_radius):
+        colorkey = (255, 0, 255) if tuple(color[:3]) == (0, 0, 0) else (0, 0, 0)
+        circle = pygame.Surface((2 * pixel_radius + 1, 2 * pixel_radius + 1))
+        circle.fill(colorkey)
+        pygame.draw.circle(circle, color=color, center=(pixel_radius, pixel_radius), radius=pixel_radius)
+        circle.set_colorkey(colorkey, pygame.RLEACCEL)
+        return circle
+
+    def _draw_cached(self, surface, color, center, radius, scale):
+        pixel_radius = int(round(radius * scale))
+        entry = self._get_entry(color, radius, scale)
+        entry[3] = entry[3] + 1 if entry[2] == pixel_radius else 1
+        entry[2] = pixel_radius
+        if entry[1] != pixel_radius and (entry[0] is None or entry[3] >= self.settle_draws):
+            entry[0], entry[1] = self._render(color, pixel_radius), pixel_radius
+        position = (round(center[0]) - pixel_radius, round(center[1]) - pixel_radius)
+        if entry[1] == pixel_radius:
+            surface.blit(entry[0], position)
+        else:
+            pygame.draw.circle(surface, color=color, center=center, radius=pixel_radius)
+
+    def _draw_clipped(self, surface, color, center, radius):
+        width, height = surface.get_size()
+        corners = ((0, 0), (width, 0), (width, height), (0, height))
+        if all((x - center[0]) ** 2 + (y - center[1]) ** 2 <= radius ** 2 for x, y in corners):
+            surface.fill(color)  # window lies inside the circle
+            return
+        nearest_x = min(max(center[0], 0), width)
+        nearest_y = min(max(center[1], 0), height)
+        if (nearest_x - center[0]) ** 2 + (nearest_y - center[1]) ** 2 > radius ** 2:
+            return  # window lies outside the circle
+
+        # the center is outside the window here: the window spans less than pi as seen from it,
+        # so the sector over that angular range contains all of the circle inside the window
+        direction = math.atan2(height / 2 - center[1], width / 2 - center[0])
+        offsets = [(math.atan2(y - center[1], x - center[0]) - direction + math.pi) % (2 * math.pi) - math.pi
+                   for x, y in corners]
+        angles = direction + np.linspace(min(offsets), max(offsets), self.arc_points)
+        sector = [tuple(center)] + list(zip(center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)))
+        visible = clip_polygon(sector, width, height)
+        if len(visible) > 2:
+            pygame.draw.polygon(surface, color=color, points=visible)
+
+
+def clip_polygon(points, width, height):
+    # Sutherland-Hodgman clipping of a polygon to the rectangle (0, 0, width, height)
+    edges = ((0, 0, 1), (0, width, -1), (1, 0, 1), (1, height, -1))  # (axis, bound, inside direction)
+    for axis, bound, direction in edges:
+        if not points:
+            break
+        clipped = []
+        previous = points[-1]
+        previous_inside = (previous[axis] - bound) * direction >= 0
+        for point in points:
+            inside = (point[axis] - bound) * direction >= 0
+            if inside != previous_inside:
+                t = (bound - previous[axis]) / (point[axis] - previous[axis])
+                clipped.append((previous[0] + t * (point[0] - previous[0]), previous[1] + t * (point[1] - previous[1])))
+            if inside:
+                clipped.append(point)
+            previous, previous_inside = point, inside
+        points = clipped
+    return points
@@ -1,9 +1,13 @@
 import pygame
 import numpy as np
+import math
 from vector import Vector
 from abc import ABC, abstractmethod
 from polygon_shapes import *
 
+GRAVITATIONAL_CONSTANT = 2e7 * 6.67 * np.power(10., -11)
+FORCE_KINDS = ('gravitational', 'aerodynamic', 'propulsion', 'contact')
+
 class ComponentBase(ABC):
     def __init__(self, entity, position_in_entity: Vector, orientation_in_entity,
                  input_functions=[],
@@ -14,31 +18,115 @@ class ComponentBase(ABC):
         self.orientation_in_entity = orientation_in_entity
         self.input_functions = input_functions
 
+        self._relative_position_version = None
+        self._global_offset_key = None
         self.mass = mass
         self.moment_of_inertia = moment_of_inertia
 
-        self.gravitational_forces = []
-        self.aerodynamic_forces = []
-        self.propulsion_forces = []
-        self.contact_forces = []
+        # forces are summed in place, per source forces are only kept while the force breakdown is enabled
+        self.propulsion_force = Vector()  # set once per step by the control inputs
+        self.interaction_force = Vector()  # gravity, wind and contact, re-evaluated at every integrator stage
+        self.contact_count = 0
+        self.force_breakdown = None  # {kind: [Vector, ...]} for FORCE_KINDS
 
         self.bounding_radius = bounding_radius
 
-        self.mixer = None
-        self.sound = None
+        self.sound_path = None  # played through the simulator's ChannelPool
+
+        self.polygon = None  # PolygonShape in component coordinates, baked once
+        self.color = None
+        self._transform_in_entity_key = None
+        self._polygon_in_entity_transform = None
+
+    @property
+    def mass(self):
+        return self._mass
+
+    @mass.setter
+    def mass(self, mass):
+        self._mass = mass
+        self.entity.invalidate_mass_properties()
+
+    def enable_force_breakdown(self, enabled=True):
+        self.force_breakdown = {kind: [] for kind in FORCE_KINDS} if enabled else None
+
+    def get_force_breakdown(self, kind):
+        # forces of one kind added since the last reset, empty unless the force breakdown is enabled
+        return self.force_breakdown[kind] if self.force_breakdown is not None else []
+
+    def add_force(self, kind, x, y):
+        force = self.propulsion_force if kind == 'propulsion' else self.interaction_force
+        force.x += x
+        force.y += y
+        if kind == 'contact':
+            self.contact_count += 1
+        if self.force_breakdown is not None:
+            self.force_breakdown[kind].append(Vector(x, y))
 
     def _reset_forces(self):
-        self.gravitational_forces = []
-        self.aerodynamic_forces = []
-        self.propulsion_forces = []
-        self.contact_forces = []
+        self._reset_propulsion_force()
+        self._reset_interaction_forces()
+
+    def _reset_propulsion_force(self):
+        self.propulsion_force.x = self.propulsion_force.y = 0.
+        if self.force_breakdown is not None:
+            self.force_breakdown['propulsion'].clear()
+
+    def _reset_interaction_forces(self):
+        # forces that depend on the state of other components, re-evaluated at every integrator stage
+        self.interaction_force.x = self.interaction_force.y = 0.
+        self.contact_count = 0
+        if self.force_breakdown is not None:
+            for kind in ('gravitational', 'aerodynamic', 'contact'):
+                self.force_breakdown[kind].clear()
 
-    def _play_sound(self):
-        if self.sound and not self.mixer.get_busy():
-            self.mixer.play(self.sound)
+    def get_sound_volume(self):
+        return 0
 
     def get_position_relative_to_center_of_gravity(self):
-        return self.position_in_entity - self.entity.get_center_of_gravity()
+        if self._relative_position_version != self.entity.mass_properties_version:
+            self._relative_position = self.position_in_entity - self.entity.get_center_of_gravity()
+            self._relative_position_version = self.entity.mass_properties_version
+        return self._relative_position
+
+    def get_global_offset(self):
+        # position relative to the center of gravity, rotated into the global coordinate system
+        cos, sin = self.entity.get_rotation()
+        key = (self.entity._transform_key, self.entity.mass_properties_version)
+        if key != self._global_offset_key:
+            rel_pos = self.get_position_relative_to_center_of_gravity()
+            self._global_offset = rel_pos.rotate_by(cos, sin)
+            self._global_offset_key = key
+        return self._global_offset
+
+    def get_transform_in_entity(self):
+        # affine transform from component coordinates to entity coordinates (relative to the center of gravity)
+        key = (self.orientation_in_entity, self.entity.mass_properties_version)
+        if key != self._transform_in_entity_key:
+            rel_pos = self.get_position_relative_to_center_of_gravity()
+            cos, sin = math.cos(self.orientation_in_entity), math.sin(self.orientation_in_entity)
+            self._transform_in_entity = np.array(((cos, -sin, rel_pos.x),
+                                                  (sin, cos, rel_pos.y),
+                                                  (0, 0, 1)))
+            self._transform_in_entity_key = key
+        return self._transform_in_entity
+
+    def get_extent(self):
+        # radius around the component position that contains everything it draws
+        extent = self.bounding_radius or 0
+        if self.polygon is not None:
+            extent = max(extent, float(np.max(np.hypot(self.polygon.points[0], self.polygon.points[1]))))
+        return extent
+
+    def get_polygons(self):
+        # polygons in entity coordinates as (points, color), drawn by the entity in one batch
+        if self.polygon is None:
+            return []
+        transform = self.get_transform_in_entity()
+        if transform is not self._polygon_in_entity_transform:
+            self._polygon_in_entity = transform.dot(self.polygon.points)
+            self._polygon_in_entity_transform = transform
+        return [(self._polygon_in_entity, self.color)]
 
     def _compute_control_inputs(self):
         pass
@@ -46,14 +134,20 @@ class ComponentBase(ABC):
     def _compute_aerodynamic_forces(self, wind_in_global):
         return Vector()
 
+    @classmethod
+    def _compute_aerodynamic_forces_batch(cls, components, winds):
+        # aerodynamic forces of shape (n, 2) on components of this class for global winds of shape (n, 2)
+        return np.array([component._compute_aerodynamic_forces(Vector(wind[0], wind[1])).get()
+                         for component, wind in zip(components, winds)]).reshape(-1, 2)
+
     def get_global_position(self):
-        return self.entity.position_of_center_of_gravity + self.get_position_relative_to_center_of_gravity().rotate(self.entity.orientation)
+        return self.entity.position_of_center_of_gravity + self.get_global_offset()
 
     def get_global_velocity(self):
         return self.entity.velocity \
-               + Vector(-np.sin(self.entity.orientation + self.orientation_in_entity),
-                         np.cos(self.entity.orientation + self.orientation_in_entity))\
-               * self.get_position_relative_to_center_of_gravity().rotate(self.entity.orientation).norm()\
+               + Vector(-math.sin(self.entity.orientation + self.orientation_in_entity),
+                         math.cos(self.entity.orientation + self.orientation_in_entity))\
+               * self.get_global_offset().norm()\
                * self.entity.velocity_angular
 
     def get_relative_position_of(self, component):
@@ -69,39 +163,42 @@ class ComponentBase(ABC):
         # describes the wind emitted to other components in global coordinate system
         return Vector()
 
-    def get_total_force(self):
-        total_force = Vector()
-        for gravitational_force in self.gravitational_forces:
-            total_force += gravitational_force
-        for aerodynamic_force in self.aerodynamic_forces:
-            total_force += aerodynamic_force
-        for propulsion_force in self.propulsion_forces:
-            total_force += propulsion_force
-        for contact_force in self.contact_forces:
-            total_force += contact_force
-        return total_force
+    def get_wind_emitted_at(self, positions, velocities):
+        # batched get_wind_emitted_to_component for receivers at global positions/velocities of shape (n, 2)
+        return np.zeros_like(positions)
 
-    def update(self, simulator):
-        self._play_sound()
+    def get_total_force(self):
+        return Vector(self.interaction_force.x + self.propulsion_force.x, self.interaction_force.y + self.propulsion_force.y)
 
-        # check for interaction with environment
+    def prepare_step(self):
         self._reset_forces()
         self._compute_control_inputs()
 
+    def update(self, simulator):
+        self.prepare_step()
+        self._compute_interactions(simulator)
+
+    def _compute_interactions(self, simulator):
+        # check for interaction with environment
         for entity in simulator.entities:
             if not entity == self.entity:
+                simulator.profiler.count('pair_tests', len(entity.components))
                 for component in entity.components:
                     if not component == self:
                         d_position = self.get_relative_position_of(component)
                         d_velocity = self.get_relative_velocity_of(component)
 
                         # update gravitational forces
-                        gravitational_force = 2e7 * 6.67 * np.power(10., -11) * (self.mass * component.mass) / max(np.power(d_position.norm(), 2), 1)
-                        self.gravitational_forces.append(d_position.unit_length() * gravitational_force)
+                        gravitational_force = GRAVITATIONAL_CONSTANT * (self.mass * component.mass) / max(np.power(d_position.norm(), 2), 1)
+                        if gravitational_force:
+                            gravitational_force = d_position.unit_length() * gravitational_force
+                            self.add_force('gravitational', gravitational_force.x, gravitational_force.y)
 
                         # update aerodynamic forces
-                        aerodynamic_force = self._compute_aerodynamic_forces(component.get_wind_emitted_to_component(self))
-                        self.aerodynamic_forces.append(aerodynamic_force)
+                        wind = component.get_wind_emitted_to_component(self)
+                        if wind.x or wind.y:
+                            aerodynamic_force = self._compute_aerodynamic_forces(wind)
+                            self.add_force('aerodynamic', aerodynamic_force.x, aerodynamic_force.y)
 
                         # get contact between components
                         if self.bounding_radius and component.bounding_radius:
@@ -113,14 +210,17 @@ class ComponentBase(ABC):
 
                             # if hasattr(self, 'length'):
                             #     print(velocity_tangential)
+                            if penetration_depth > 0 and entity.is_sleeping:
+                                entity.wake()
                             if penetration_depth > 0 and d_velocity.norm() > 5:
                                 self.entity.crash()
                             elif penetration_depth > 0:
+                                simulator.profiler.count('contacts')
                                 normal_force = -d_position.unit_length() * 100 * self.entity.get_total_mass() * (penetration_depth - 1e-2 * velocity_radial)
                                 # friction_force = -normal_force.rotate(np.pi/2) * np.sign(velocity_tangential)
                                 # if hasattr(self, 'length'):
                                 #     print(velocity_tangential)
-                                self.contact_forces.append(normal_force)
+                                self.add_force('contact', normal_force.x, normal_force.y)
                                 # self.contact_forces.append(friction_force)
 
                                 # self.contact_forces.append(contact_force)
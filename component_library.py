@@ -1,9 +1,10 @@
+import math
 import numpy as np
 import pygame
 import time
 from component_base import ComponentBase
 from polygon_shapes import *
-from apostolyuk import get_lift_coeff, get_drag_coeff
+from aero_tables import get_lift_table, get_drag_table
 
 class Mass(ComponentBase):
     def __init__(self, entity, position_in_entity, mass, moment_of_inertia):
@@ -19,10 +20,13 @@ class Sphere(ComponentBase):
         self.radius = radius
         self.color = color
 
+    def get_extent(self):
+        return self.radius
+
     def draw(self, simulator):
-        pygame.draw.circle(simulator.window, color=self.color,
-                           center=(simulator.position_from_physical(self.get_global_position())).get(),
-                           radius=self.radius * simulator.scale)
+        simulator.circle_renderer.draw(simulator.window, self.color,
+                                       simulator.position_from_physical(self.get_global_position()).get(),
+                                       self.radius, simulator.scale)
         # for angle in np.linspace(0, 2*np.pi, 360):
         #     pos = self.get_global_position() + Vector(np.cos(angle), np.sin(angle)) * self.radius
         #     pygame.draw.circle(simulator.window, color=(0, 0, 0),
@@ -38,6 +42,9 @@ class Athmosphere(ComponentBase):
         self.color = color
         self.max_wind = max_wind
 
+    def get_extent(self):
+        return self.radius
+
     def get_wind_emitted_to_component(self, component):
         d_position = component.get_global_position() - self.get_global_position()
         d_velocity = self.get_global_velocity() - component.get_global_velocity()
@@ -48,11 +55,20 @@ class Athmosphere(ComponentBase):
         else:
             return Vector()
 
+    def get_wind_emitted_at(self, positions, velocities):
+        d_position = positions - self.get_global_position().get()
+        d_velocity = self.get_global_velocity().get() - velocities
+        distance_to_center = np.sqrt(d_position[:, 0]**2 + d_position[:, 1]**2)
+        additional_wind_speed = self.max_wind / self.radius * distance_to_center
+        wind_direction = np.stack((d_position[:, 1], -d_position[:, 0]), axis=1) / np.maximum(distance_to_center, 1e-3)[:, None]
+        wind = d_velocity + wind_direction * additional_wind_speed[:, None]
+        wind[distance_to_center >= self.radius] = 0
+        return wind
 
     def draw(self, simulator):
-        pygame.draw.circle(simulator.window, color=self.color,
-                           center=(simulator.position_from_physical(self.get_global_position())).get(),
-                           radius=self.radius * simulator.scale)
+        simulator.circle_renderer.draw(simulator.window, self.color,
+                                       simulator.position_from_physical(self.get_global_position()).get(),
+                                       self.radius, simulator.scale)
 
 class LandingLeg(ComponentBase):
     def __init__(self, entity, position_in_entity, orientation_in_entity, length, width, mass=0):
@@ -68,13 +84,7 @@ class LandingLeg(ComponentBase):
                                               (self.width/6, self.width/4, 1),
                                               (self.width/2, self.width/4, 1),
                                               (self.width/2, 0, 1))).transpose())
-
-    def draw(self, simulator):
-        polygon = self.polygon.rotate(self.orientation_in_entity)\
-            .translate(self.get_position_relative_to_center_of_gravity())\
-            .rotate(self.entity.orientation)\
-            .translate(self.entity.position_of_center_of_gravity).to_simulator(simulator)
-        pygame.draw.polygon(simulator.window, color=(50, 50, 50), points=polygon)
+        self.color = (50, 50, 50)
 
 
 class RocketBody(ComponentBase):
@@ -105,7 +115,8 @@ class RocketBody(ComponentBase):
                                               (self.diameter/2, (self.height - self.diameter), 1),
                                               (self.diameter/1.4, self.height / 2, 1),
                                               (self.diameter/2, self.diameter, 1),
-                                              (self.diameter, 0, 1))).transpose())
+                                              (self.diameter, 0, 1))).transpose())\
+            .translate(Vector(0, -self.height * self.rel_height_pressure_center))
 
     def _compute_aerodynamic_forces(self, wind_in_global):
         if wind_in_global.norm() > 0:
@@ -116,13 +127,22 @@ class RocketBody(ComponentBase):
         drag = self.drag_coeff * relative_wind[1] * self.drag_area
         return Vector(lift, drag).rotate(self.orientation_in_entity).rotate(self.entity.orientation)
 
-    def draw(self, simulator):
-        polygon = self.polygon.translate(Vector(0, -self.height * self.rel_height_pressure_center))\
-            .rotate(self.orientation_in_entity)\
-            .translate(self.get_position_relative_to_center_of_gravity())\
-            .rotate(self.entity.orientation)\
-            .translate(self.entity.position_of_center_of_gravity).to_simulator(simulator)
-        pygame.draw.polygon(simulator.window, color=self.color, points=polygon)
+    @classmethod
+    def _compute_aerodynamic_forces_batch(cls, components, winds):
+        orientations = np.array([component.entity.orientation + component.orientation_in_entity for component in components])
+        velocities = np.array([component.get_global_velocity().get() for component in components]).reshape(-1, 2)
+        coefficients = np.array([(component.lift_coeff * component.lift_area, component.drag_coeff * component.drag_area)
+                                 for component in components]).reshape(-1, 2)
+        return cls.get_forces(orientations, velocities, winds, coefficients[:, 0], coefficients[:, 1])
+
+    @staticmethod
+    def get_forces(orientations, velocities, winds, lift_factors, drag_factors):
+        # array version of _compute_aerodynamic_forces for nonzero winds, lift and drag factors are coefficient times area
+        cos, sin = np.cos(orientations), np.sin(orientations)
+        relative_wind = winds - velocities
+        lift = lift_factors * (cos * relative_wind[:, 0] + sin * relative_wind[:, 1])
+        drag = drag_factors * (-sin * relative_wind[:, 0] + cos * relative_wind[:, 1])
+        return np.stack((cos * lift - sin * drag, sin * lift + cos * drag), axis=1)
 
 class Thruster(ComponentBase):
     def __init__(self, entity, position_in_entity, orientation_in_entity, input_functions=[], mass=1, max_thrust=1):
@@ -133,65 +153,92 @@ class Thruster(ComponentBase):
         self.max_thrust = max_thrust
         self.original_angle = orientation_in_entity
         self.throttle = 0
-        counter = 1
-        for c in self.entity.components:
-            if c.mixer:
-                counter += 1
-        self.mixer = pygame.mixer.Channel(counter)
-        self.sound = pygame.mixer.Sound('rocket_sound.mp3')
-        
+        self.polygon = PolygonShape(np.array(((0, 0, 1),
+                                              (0.6, -0.5, 1),
+                                              (1, -1, 1),
+                                              (-1, -1, 1),
+                                              (-0.6, -0.5, 1))).transpose()).scale(self.max_thrust / 1000)
+        self.flame_polygon = PolygonShape(np.array(((-0.5, -1, 1),
+                                                    (0, -1, 1),
+                                                    (0.5, -1, 1))).transpose()).scale(self.max_thrust / 1000)
+        self.color = (100, 100, 100)
+        self.sound_path = 'rocket_sound.mp3'
+
     def _compute_control_inputs(self):
         if len(self.input_functions) > 0:
             self.throttle = np.clip(self.input_functions[0](), 0, 1)
-            self.propulsion_forces.append(Vector(0, self.throttle * self.max_thrust).rotate(self.orientation_in_entity).rotate(self.entity.orientation))
-            self.sound.set_volume(0.5 * self.throttle)
+            if self.throttle:
+                thrust = float(self.throttle * self.max_thrust)
+                angle = self.entity.orientation + self.orientation_in_entity
+                self.add_force('propulsion', -math.sin(angle) * thrust, math.cos(angle) * thrust)
         if len(self.input_functions) > 1:
             self.orientation_in_entity = np.clip(self.original_angle + self.input_functions[1](),
                                                  self.original_angle - np.pi / 8, self.original_angle + np.pi / 8)
 
-    def draw(self, simulator):
-        thruster_polygon = [Vector(0, 0), Vector(0.6, -0.5), Vector(1, -1), Vector(-1, -1), Vector(-0.6, -0.5)]
-        flame_polygon = [Vector(-0.5, -1), Vector(0, -1 - self.throttle * self.max_thrust / 25), Vector(0.5, -1)]
-        thruster_polygon = scale_polygon(thruster_polygon, self.max_thrust/1000)
-        flame_polygon = scale_polygon(flame_polygon, self.max_thrust/1000)
-        thruster_polygon = rotate_polygon(thruster_polygon, self.orientation_in_entity)
-        flame_polygon = rotate_polygon(flame_polygon, self.orientation_in_entity)
-        thruster_polygon = translate_polygon(thruster_polygon, self.get_position_relative_to_center_of_gravity())
-        flame_polygon = translate_polygon(flame_polygon, self.get_position_relative_to_center_of_gravity())
-        thruster_polygon = rotate_polygon(thruster_polygon, self.entity.orientation)
-        flame_polygon = rotate_polygon(flame_polygon, self.entity.orientation)
-        thruster_polygon = translate_polygon(thruster_polygon, self.entity.position_of_center_of_gravity)
-        flame_polygon = translate_polygon(flame_polygon, self.entity.position_of_center_of_gravity)
-        thruster_polygon = simulator.polygon_from_physical(thruster_polygon)
-        flame_polygon = simulator.polygon_from_physical(flame_polygon)
-        pygame.draw.polygon(simulator.window, color=(100, 100, 100), points=make_pairs(thruster_polygon))
-        pygame.draw.polygon(simulator.window, color=(255, 136, 0), points=make_pairs(flame_polygon))
-
-# class Airfoil(ComponentBase):
-#     def __init__(self, entity, mass, position_in_entity, orientation_in_entity, area, input_functions=[]):
-#         super().__init__(entity, mass, position_in_entity, orientation_in_entity, input_functions)
-#         self.area = area
-#         self.induced_forces = [Vector(), Vector()]
-#         ratio = 8
-#         scale = 0.5
-#         self.polygon_shape = [Vector(scale * area/3, scale * area/ratio),
-#                               Vector(scale * area/3, 0),
-#                               Vector(-2*scale * area/2, 0),
-#                               Vector(-2*scale * area/2, scale * area/ratio)]
-#
-#     def _compute_control_inputs(self):
-#         self.orientation_in_entity = self.input_functions[0]()
-#
-#     # TODO: REWORK
-#     def _compute_induced_forces(self, relative_wind):
-#         relative_wind = relative_wind.rotate(-self.orientation_in_entity)
-#         angle_of_attack = np.arctan2(relative_wind[1], -relative_wind[0])
-#         lift = get_lift_coeff(angle_of_attack) * relative_wind.norm() * self.area
-#         drag = get_drag_coeff(angle_of_attack) * relative_wind.norm() * self.area
-#         # print('{:5.3f}, {:5.3f}, {:5.3f}'.format(relative_wind.norm(), self.entity.velocity[1], self.entity.velocity[1]))
-#         self.induced_forces[0] = Vector(-drag, 0).rotate(-angle_of_attack)
-#         self.induced_forces[1] = Vector(0, lift).rotate(-angle_of_attack)
-#
-#     def draw(self):
-#         # TODO: REWORK
-#         pass
\ No newline at end of file
+    def get_sound_volume(self):
+        return 0.5 * self.throttle
+
+    def get_extent(self):
+        # nozzle and flame at full throttle
+        return (1 + self.max_thrust / 25) * self.max_thrust / 1000 * np.sqrt(2)
+
+    def get_polygons(self):
+        polygons = super().get_polygons()
+        self.flame_polygon.points[1, 1] = (-1 - self.throttle * self.max_thrust / 25) * self.max_thrust / 1000
+        polygons.append((self.get_transform_in_entity().dot(self.flame_polygon.points), (255, 136, 0)))
+        return polygons
+
+class Airfoil(ComponentBase):
+    # Wing with lift and drag coefficients over the angle of attack looked up in shared CoefficientTables.
+    # The chord points along -x in component coordinates, input_functions[0] deflects the wing.
+    def __init__(self, entity, position_in_entity, orientation_in_entity, area, mass=0, input_functions=[],
+                 max_deflection=np.pi / 8, lift_table=None, drag_table=None, color=(200, 200, 200)):
+        super().__init__(entity, position_in_entity, orientation_in_entity,
+                         input_functions=input_functions,
+                         mass=mass, moment_of_inertia=0,
+                         bounding_radius=None)
+        self.area = area
+        self.original_angle = orientation_in_entity
+        self.max_deflection = max_deflection
+        self.lift_table = lift_table or get_lift_table()
+        self.drag_table = drag_table or get_drag_table()
+        self.color = color
+        ratio = 8
+        scale = 0.5
+        self.polygon = PolygonShape(np.array(((scale * area / 3, scale * area / ratio, 1),
+                                              (scale * area / 3, 0, 1),
+                                              (-scale * area, 0, 1),
+                                              (-scale * area, scale * area / ratio, 1))).transpose())
+
+    def _compute_control_inputs(self):
+        if len(self.input_functions) > 0:
+            self.orientation_in_entity = self.original_angle + np.clip(self.input_functions[0](), -self.max_deflection, self.max_deflection)
+
+    def _compute_aerodynamic_forces(self, wind_in_global):
+        return Vector(*self._compute_aerodynamic_forces_batch([self], np.array((wind_in_global.get(),)))[0])
+
+    @classmethod
+    def _compute_aerodynamic_forces_batch(cls, components, winds):
+        # winds are relative to the receiving components already (see Athmosphere.get_wind_emitted_at).
+        # Drag acts along the relative wind and lift perpendicular to it, both proportional to the wind speed
+        # like the forces on RocketBody
+        orientations = np.array([component.entity.orientation + component.orientation_in_entity for component in components])
+        areas = np.array([component.area for component in components])
+        forces = np.empty((len(components), 2))
+        tables = [(component.lift_table, component.drag_table) for component in components]
+        for lift_table, drag_table in set(tables):
+            group = np.array([k for k, component_tables in enumerate(tables) if component_tables == (lift_table, drag_table)])
+            forces[group] = cls.get_forces(orientations[group], areas[group], winds[group], lift_table, drag_table)
+        return forces
+
+    @staticmethod
+    def get_forces(orientations, areas, winds, lift_table, drag_table):
+        cos, sin = np.cos(orientations), np.sin(orientations)
+        wind_x = cos * winds[:, 0] + sin * winds[:, 1]  # rotated into component coordinates
+        wind_y = -sin * winds[:, 0] + cos * winds[:, 1]
+        angles_of_attack = np.arctan2(wind_y, -wind_x)
+        lift_coeffs = lift_table(angles_of_attack)
+        drag_coeffs = drag_table(angles_of_attack)
+        force_x = areas * (drag_coeffs * wind_x + lift_coeffs * wind_y)
+        force_y = areas * (drag_coeffs * wind_y - lift_coeffs * wind_x)
+        return np.stack((cos * force_x - sin * force_y, sin * force_x + cos * force_y), axis=1)
@@ -0,0 +1,199 @@
+import contextlib
+import io
+import numpy as np
+from component_base import ComponentBase, GRAVITATIONAL_CONSTANT
+from component_library import Thruster, RocketBody, Airfoil
+from entity_library import Rocket
+from pid_controller import PIDController
+
+
+class ScheduledController:
+    # Batched sweep.ScriptedController: throttle schedules of shape (rockets, breakpoints) over shared
+    # breakpoint times, linearly interpolated, and a PID per rocket on the thrust vector that damps the
+    # angular velocity. Gains may be scalars or one per rocket.
+    def __init__(self, times, throttles, k_proportional=0.5, k_integral=0, k_derivative=0):
+        self.times = np.asarray(times, dtype=float)
+        self.throttles = np.atleast_2d(np.asarray(throttles, dtype=float))
+        self.pid = PIDController(np.asarray(k_proportional, dtype=float), np.asarray(k_integral, dtype=float),
+                                 np.asarray(k_derivative, dtype=float))
+
+    def get_throttles(self, time):
+        if len(self.times) == 1:
+            return self.throttles[:, 0]
+        k = int(np.clip(np.searchsorted(self.times, time, side='right') - 1, 0, len(self.times) - 2))
+        fraction = np.clip((time - self.times[k]) / (self.times[k + 1] - self.times[k]), 0, 1)
+        return self.throttles[:, k] * (1 - fraction) + self.throttles[:, k + 1] * fraction
+
+    def __call__(self, ensemble):
+        main_thruster = ensemble.thrusters[0]
+        return {main_thruster: (self.get_throttles(ensemble.time), self.pid.get(-ensemble.velocity_angular, 0))}
+
+
+class RocketEnsemble:
+    # Lockstep simulation of count copies of one Rocket layout flying through shared fixed planets.
+    # Rockets do not interact, so the state of all of them lives in arrays of shape (count, ...) and
+    # every step is one batched pass through the force and integration kernels, which follow the
+    # object model (gravity, RocketBody and Airfoil aerodynamics, landing leg contact, semi-implicit
+    # Euler) term by term. controller(ensemble) returns {component index: tuple of input arrays},
+    # one array per input function the component would have, e.g. (throttle, vector) for the main
+    # thruster of a Rocket; components without inputs keep their state.
+    def __init__(self, planets, count, controller=None, **rocket_parameters):
+        with contextlib.redirect_stdout(io.StringIO()):  # entities print on creation
+            self.template = Rocket(**rocket_parameters)
+        self.count = count
+        self.controller = controller
+        self.time = 0
+
+        components = self.template.components
+        self.offsets = np.array([component.get_position_relative_to_center_of_gravity().get() for component in components])
+        self.masses = np.array([component.mass for component in components], dtype=float)
+        self.total_mass = self.template.get_total_mass()
+        self.moment_of_inertia = self.template._get_moment_of_inertia()
+        self.thrusters = [k for k, component in enumerate(components) if isinstance(component, Thruster)]
+        self.max_thrust = np.array([components[k].max_thrust for k in self.thrusters])
+        self.bodies = [k for k, component in enumerate(components) if isinstance(component, RocketBody)]
+        self.airfoils = [k for k, component in enumerate(components) if isinstance(component, Airfoil)]
+        self.colliders = [k for k, component in enumerate(components) if component.bounding_radius]
+        self.collider_radii = np.array([components[k].bounding_radius for k in self.colliders])
+        self.original_angles = np.array([getattr(component, 'original_angle', component.orientation_in_entity) for component in components])
+
+        planet_components = [component for planet in planets for component in planet.components]
+        self.planet_positions = np.array([component.get_global_position().get() for component in planet_components]).reshape(-1, 2)
+        self.planet_velocities = np.array([component.get_global_velocity().get() for component in planet_components]).reshape(-1, 2)
+        self.planet_masses = np.array([component.mass for component in planet_components], dtype=float)
+        self.planet_radii = np.array([component.bounding_radius or 0 for component in planet_components], dtype=float)
+        self.emitters = [component for component in planet_components
+                         if type(component).get_wind_emitted_at is not ComponentBase.get_wind_emitted_at]
+
+        self.position = np.tile(self.template.position_of_center_of_gravity.get(), (count, 1)).astype(float)
+        self.velocity = np.zeros((count, 2))
+        self.orientation = np.full(count, float(self.template.orientation))
+        self.velocity_angular = np.zeros(count)
+        self.orientation_in_entity = np.tile([component.orientation_in_entity for component in components], (count, 1)).astype(float)
+        self.throttle = np.zeros((count, len(self.thrusters)))
+        self.is_crashed = np.zeros(count, dtype=bool)
+        self.in_contact = np.zeros(count, dtype=bool)
+
+    def get_component_kinematics(self):
+        # global positions and velocities of shape (count, components, 2)
+        cos, sin = np.cos(self.orientation)[:, None], np.sin(self.orientation)[:, None]
+        offsets = np.stack((cos * self.offsets[:, 0] - sin * self.offsets[:, 1],
+                            sin * self.offsets[:, 0] + cos * self.offsets[:, 1]), axis=2)
+        positions = self.position[:, None, :] + offsets
+        angles = self.orientation[:, None] + self.orientation_in_entity
+        speed = np.sqrt(offsets[:, :, 0]**2 + offsets[:, :, 1]**2) * self.velocity_angular[:, None]
+        velocities = self.velocity[:, None, :] + np.stack((-np.sin(angles), np.cos(angles)), axis=2) * speed[:, :, None]
+        return offsets, positions, velocities
+
+    def _apply_controls(self, forces):
+        inputs = self.controller(self) if self.controller else {}
+        components = self.template.components
+        for t, k in enumerate(self.thrusters):
+            if k not in inputs:
+                continue
+            self.throttle[:, t] = np.clip(inputs[k][0], 0, 1)
+            # thrust along the nozzle orientation before this step's gimbal input, like Thruster
+            angle = self.orientation + self.orientation_in_entity[:, k]
+            forces[:, k, 0] += -np.sin(angle) * self.throttle[:, t] * self.max_thrust[t]
+            forces[:, k, 1] += np.cos(angle) * self.throttle[:, t] * self.max_thrust[t]
+            if len(inputs[k]) > 1:
+                self.orientation_in_entity[:, k] = np.clip(self.original_angles[k] + inputs[k][1],
+                                                           self.original_angles[k] - np.pi / 8, self.original_angles[k] + np.pi / 8)
+        for k in self.airfoils:
+            if k in inputs:
+                deflection = components[k].max_deflection
+                self.orientation_in_entity[:, k] = self.original_angles[k] + np.clip(inputs[k][0], -deflection, deflection)
+
+    def _add_gravity(self, forces, positions):
+        d_position = self.planet_positions[None, None, :, :] - positions[:, :, None, :]
+        distance_squared = d_position[..., 0]**2 + d_position[..., 1]**2
+        magnitude = GRAVITATIONAL_CONSTANT * (self.masses[None, :, None] * self.planet_masses) / np.maximum(distance_squared, 1)
+        forces += np.sum(d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[..., None], axis=2)
+
+    def _add_aerodynamics(self, forces, positions, velocities):
+        components = self.template.components
+        receivers = self.bodies + self.airfoils
+        if not receivers:
+            return
+        receiver_positions = positions[:, receivers].reshape(-1, 2)
+        receiver_velocities = velocities[:, receivers].reshape(-1, 2)
+        for emitter in self.emitters:
+            winds = emitter.get_wind_emitted_at(receiver_positions, receiver_velocities).reshape(self.count, len(receivers), 2)
+            for r, k in enumerate(receivers):
+                active = np.flatnonzero(np.any(winds[:, r] != 0, axis=1))
+                if len(active) == 0:
+                    continue
+                orientations = self.orientation[active] + self.orientation_in_entity[active, k]
+                component = components[k]
+                if k in self.bodies:
+                    forces[active, k] += RocketBody.get_forces(orientations, velocities[active, k], winds[active, r],
+                                                               component.lift_coeff * component.lift_area,
+                                                               component.drag_coeff * component.drag_area)
+                else:
+                    forces[active, k] += Airfoil.get_forces(orientations, component.area, winds[active, r],
+                                                            component.lift_table, component.drag_table)
+
+    def _add_contacts(self, forces, positions, velocities):
+        self.in_contact[:] = False
+        colliding_planets = np.flatnonzero(self.planet_radii > 0)
+        if not self.colliders or len(colliding_planets) == 0:
+            return
+        d_position = self.planet_positions[colliding_planets][None, None] - positions[:, self.colliders, None, :]
+        distance = np.sqrt(d_position[..., 0]**2 + d_position[..., 1]**2)
+        penetration_depth = self.collider_radii[:, None] + self.planet_radii[colliding_planets] - distance
+        rocket, collider, planet = np.nonzero(penetration_depth > 0)
+        if len(rocket) == 0:
+            return
+        d_position = d_position[rocket, collider, planet]
+        distance = distance[rocket, collider, planet]
+        d_velocity = self.planet_velocities[colliding_planets[planet]] - velocities[rocket, np.array(self.colliders)[collider]]
+        speed = np.sqrt(d_velocity[:, 0]**2 + d_velocity[:, 1]**2)
+        crashing = speed > 5
+        self.is_crashed[rocket[crashing]] = True
+        touching = ~crashing
+        rocket, collider, planet = rocket[touching], collider[touching], planet[touching]
+        d_position, distance, d_velocity = d_position[touching], distance[touching], d_velocity[touching]
+        velocity_radial = (d_velocity[:, 0] * d_position[:, 0] + d_velocity[:, 1] * d_position[:, 1]) / distance
+        magnitude = 100 * (penetration_depth[rocket, collider, planet] - 1e-2 * velocity_radial) * self.total_mass
+        force = -d_position / np.maximum(distance, 1e-3)[:, None] * magnitude[:, None]
+        np.add.at(forces, (rocket, np.array(self.colliders)[collider]), force)
+        self.in_contact[rocket] = True
+
+    def step(self, time_step):
+        forces = np.zeros((self.count, len(self.template.components), 2))
+        self._apply_controls(forces)
+        offsets, positions, velocities = self.get_component_kinematics()
+        self._add_gravity(forces, positions)
+        self._add_aerodynamics(forces, positions, velocities)
+        self._add_contacts(forces, positions, velocities)
+
+        total_force = forces.sum(axis=1)
+        total_torque = np.sum(offsets[:, :, 0] * forces[:, :, 1] - offsets[:, :, 1] * forces[:, :, 0], axis=1)
+        active = ~self.is_crashed
+        self.velocity[active] += total_force[active] / self.total_mass * time_step
+        self.velocity_angular[active] += total_torque[active] / self.moment_of_inertia * time_step
+        self.position[active] += self.velocity[active] * time_step
+        self.orientation[active] += self.velocity_angular[active] * time_step
+        self.time += time_step
+
+    def advance(self, t_end, time_step):
+        while self.time < t_end - 1e-12:
+            self.step(min(time_step, t_end - self.time))
+
+
+if '__main__' == __name__:
+    import time
+    from entity_library import Planet
+    from vector import Vector
+    with contextlib.redirect_stdout(io.StringIO()):
+        planets = [Planet(position_init=Vector(0, 100), radius=100, density=5, athmosphere_radius=200, max_wind=5)]
+    count = 1000
+    throttles = np.random.default_rng(0).uniform(0, 1, (count, 4))
+    ensemble = RocketEnsemble(planets, count, ScheduledController((0, 1, 2, 3), throttles),
+                              position_init=Vector(0, -3), orientation_init=np.pi, mass=100, max_thrust=250,
+                              max_thrust_thrusters=100, height=2, diameter=0.3, rel_height_pressure_center=0.2)
+    start = time.perf_counter()
+    ensemble.advance(5, 0.01)
+    elapsed = time.perf_counter() - start
+    print('{} rockets, 500 steps in {:.2f} s ({:.1f} us per rocket step), {} crashed, {} in contact'.format(
+        count, elapsed, elapsed / 500 / count * 1e6, ensemble.is_crashed.sum(), ensemble.in_contact.sum()))
@@ -1,5 +1,6 @@
 import pygame
 import numpy as np
+import math
 from abc import ABC, abstractmethod
 from vector import Vector
 from polygon_shapes import *
@@ -7,7 +8,7 @@ from polygon_shapes import *
 class EntityBase(ABC):
     def __init__(self, position_init: Vector = Vector(), orientation_init=0, name='', fixed=False, can_crash=False):
         self.name = name
-        self.position_of_center_of_gravity = position_init
+        self.position_of_center_of_gravity = position_init.copy()  # vectors are updated in place
         self.orientation = orientation_init  # rad
         self.velocity = Vector()
         self.velocity_angular = 0
@@ -15,48 +16,106 @@ class EntityBase(ABC):
         self.fixed = fixed
         self.can_crash = can_crash
         self.is_crashed = False
+        self.is_sleeping = False  # resting entities are not integrated until woken
+        self.sleep_timer = 0
+
+        self.mass_properties_version = 0
+        self._total_mass = None
+        self._center_of_gravity = None
+        self._moment_of_inertia = None
+        self._bounding_radius = None
+        self._transform_key = None
+        self._transform = np.eye(3)
+        self._rotation = (1., 0.)
 
         print('created entity at {}'.format(self.position_of_center_of_gravity))
 
     def add_component(self, component):
         self.components.append(component)
+        self.invalidate_mass_properties()
+
+    def invalidate_mass_properties(self):
+        # called whenever components or their masses change
+        self.mass_properties_version += 1
+        self._total_mass = None
+        self._center_of_gravity = None
+        self._moment_of_inertia = None
+        self._bounding_radius = None
 
     def get_total_mass(self):
-        total_mass = 0
-        for component in self.components:
-            total_mass += component.mass
-        return total_mass
+        if self._total_mass is None:
+            total_mass = 0
+            for component in self.components:
+                total_mass += component.mass
+            self._total_mass = total_mass
+        return self._total_mass
 
     def get_center_of_gravity(self):
-        center_of_gravity = Vector()
-        for component in self.components:
-            center_of_gravity += component.position_in_entity * component.mass
-        center_of_gravity = center_of_gravity / self.get_total_mass()
-        return center_of_gravity  # in entity coordinate system
+        if self._center_of_gravity is None:
+            center_of_gravity = Vector()
+            for component in self.components:
+                center_of_gravity += component.position_in_entity * component.mass
+            self._center_of_gravity = center_of_gravity / self.get_total_mass()
+        return self._center_of_gravity  # in entity coordinate system
+
+    def get_bounding_radius(self):
+        # radius around the center of gravity that contains everything the entity draws
+        if self._bounding_radius is None:
+            self._bounding_radius = max((component.get_position_relative_to_center_of_gravity().norm() + component.get_extent()
+                                         for component in self.components), default=0)
+        return self._bounding_radius
+
+    def get_lod_color(self):
+        return next((component.color for component in self.components if component.color), (255, 255, 255))
+
+    def _update_transform(self):
+        position = self.position_of_center_of_gravity
+        key = (self.orientation, position.x, position.y)
+        if key != self._transform_key:
+            cos, sin = math.cos(self.orientation), math.sin(self.orientation)
+            self._transform = np.array(((cos, -sin, key[1]),
+                                        (sin, cos, key[2]),
+                                        (0, 0, 1)))
+            self._rotation = (cos, sin)
+            self._transform_key = key
+
+    def get_transform(self):
+        # affine transform from entity coordinates (relative to the center of gravity) to global coordinates
+        self._update_transform()
+        return self._transform
+
+    def get_rotation(self):
+        # (cos, sin) of the entity orientation
+        self._update_transform()
+        return self._rotation
 
     def get_distance_to(self, other):
         return (self.position_of_center_of_gravity - other.position_of_center_of_gravity).norm()
 
     def _get_moment_of_inertia(self):
-        total_moment_of_inertia = 0
-        for component in self.components:
-            rel_pos = component.get_position_relative_to_center_of_gravity()
-            total_moment_of_inertia += (rel_pos[0]**2 + rel_pos[1]**2)**2 * component.mass + component.moment_of_inertia
-        return total_moment_of_inertia
+        if self._moment_of_inertia is None:
+            total_moment_of_inertia = 0
+            for component in self.components:
+                rel_pos = component.get_position_relative_to_center_of_gravity()
+                total_moment_of_inertia += (rel_pos[0]**2 + rel_pos[1]**2)**2 * component.mass + component.moment_of_inertia
+            self._moment_of_inertia = total_moment_of_inertia
+        return self._moment_of_inertia
 
     def _get_total_force(self):
         total_force = Vector()
         for component in self.components:
-            total_force += component.get_total_force()
+            total_force += component.interaction_force
+            total_force += component.propulsion_force
         return total_force
 
     def _get_total_torque(self):
         total_torque = 0
         for component in self.components:
-            rel_pos = component.get_position_relative_to_center_of_gravity().rotate(self.orientation)
-            component_force = component.get_total_force()
-            total_torque += rel_pos[0] * component_force[1]
-            total_torque += rel_pos[1] * -component_force[0]
+            rel_pos = component.get_global_offset()
+            force_x = component.interaction_force.x + component.propulsion_force.x
+            force_y = component.interaction_force.y + component.propulsion_force.y
+            total_torque += rel_pos.x * force_y
+            total_torque += rel_pos.y * -force_x
         return total_torque
 
     def _draw_geometry(self, simulator):
@@ -78,30 +137,123 @@ class EntityBase(ABC):
     def crash(self):
         self.is_crashed = self.can_crash
 
-    def update_and_draw(self, simulator, time_step):
+    def is_in_contact(self):
+        return any(component.contact_count for component in self.components)
+
+    def sleep(self):
+        self.is_sleeping = True
+        self.velocity = Vector()
+        self.velocity_angular = 0
+
+    def wake(self):
+        self.is_sleeping = False
+        self.sleep_timer = 0
+
+    def update_sleep(self, time_step, velocity_threshold, velocity_angular_threshold, sleep_time):
+        # falls asleep after resting in contact below the velocity thresholds for sleep_time
+        if self.velocity.norm() < velocity_threshold and abs(self.velocity_angular) < velocity_angular_threshold \
+                and self.is_in_contact():
+            self.sleep_timer += time_step
+            if self.sleep_timer >= sleep_time:
+                self.sleep()
+        else:
+            self.sleep_timer = 0
+
+    def prepare_sleeping_step(self):
+        # control inputs only, interaction forces are kept from the last step before falling asleep.
+        # Any propulsion wakes the entity
+        for component in self.components:
+            component._reset_propulsion_force()
+            component._compute_control_inputs()
+        if any(component.propulsion_force.x or component.propulsion_force.y for component in self.components):
+            self.wake()
+
+    def compute_forces(self, simulator):
         for component in self.components:
             component.update(simulator)
 
-        if not self.is_crashed:
-            if not self.fixed:
-                acceleration = self._get_total_force() / self.get_total_mass()
-                acceleration_angular = self._get_total_torque() / self._get_moment_of_inertia()
-                self.velocity += acceleration * time_step
-                self.velocity_angular += acceleration_angular * time_step
-                self.position_of_center_of_gravity += self.velocity * time_step
-                self.orientation += self.velocity_angular * time_step
+    def get_accelerations(self):
+        # linear and angular acceleration from the forces currently acting on the components,
+        # force and torque are summed in one pass
+        force_x = force_y = torque = 0.
+        for component in self.components:
+            rel_pos = component.get_global_offset()
+            component_force_x = component.interaction_force.x + component.propulsion_force.x
+            component_force_y = component.interaction_force.y + component.propulsion_force.y
+            force_x += component_force_x
+            force_y += component_force_y
+            torque += rel_pos.x * component_force_y - rel_pos.y * component_force_x
+        total_mass = self.get_total_mass()
+        return Vector(force_x / total_mass, force_y / total_mass), torque / self._get_moment_of_inertia()
+
+    def get_state(self):
+        return (self.position_of_center_of_gravity.x, self.position_of_center_of_gravity.y, self.orientation,
+                self.velocity.x, self.velocity.y, self.velocity_angular)
+
+    def set_state(self, state):
+        self.position_of_center_of_gravity = Vector(state[0], state[1])
+        self.orientation = float(state[2])
+        self.velocity = Vector(state[3], state[4])
+        self.velocity_angular = float(state[5])
+
+    def integrate(self, time_step):
+        # semi-implicit Euler step
+        if self.is_crashed or self.fixed:
+            return
+        acceleration, acceleration_angular = self.get_accelerations()
+        self.velocity += acceleration * time_step
+        self.velocity_angular += acceleration_angular * time_step
+        self.position_of_center_of_gravity += self.velocity * time_step
+        self.orientation += self.velocity_angular * time_step
 
+    def update(self, simulator, time_step):
+        if not self.fixed:
+            self.compute_forces(simulator)
+            self.integrate(time_step)
+
+    def draw(self, simulator):
+        profiler = simulator.profiler
+        bounding_radius = self.get_bounding_radius()
+        if self.is_crashed:
+            bounding_radius = max(bounding_radius, self.get_total_mass() / 10 * 1.25)  # explosion
+        if not simulator.is_visible(self.position_of_center_of_gravity, bounding_radius):
+            profiler.count('culled_entities')
+            return
+
+        if not self.is_crashed and bounding_radius * simulator.scale < simulator.lod_pixels:
+            # too small to make out any geometry
+            profiler.count('lod_entities')
+            pygame.draw.circle(simulator.window, self.get_lod_color(),
+                               simulator.position_from_physical(self.position_of_center_of_gravity).get(), 1)
+        elif not self.is_crashed:
             self._draw_geometry(simulator)
+            start = profiler.start()
+            polygons = [polygon for component in self.components for polygon in component.get_polygons()]
+            if polygons:
+                polygons = transform_polygons(polygons, simulator.get_screen_transform().dot(self.get_transform()))
+            profiler.stop('draw/polygon_transform', start)
+            start = profiler.start()
+            for points, color in polygons:
+                pygame.draw.polygon(simulator.window, color=color, points=points)
+            profiler.stop('draw/pygame_polygons', start)
             for component in self.components:
+                if component.polygon is None and not simulator.is_visible(component.get_global_position(), component.get_extent()):
+                    profiler.count('culled_components')
+                    continue
+                start = profiler.start()
                 component.draw(simulator)
+                profiler.stop('draw/' + type(component).__name__, start)
             pygame.draw.circle(simulator.window, (0, 0, 0), simulator.position_from_physical(self.position_of_center_of_gravity).get(), simulator.scale * 0.05)
         else:
             explosion_radius_init = self.get_total_mass() / 10
             explosion_radius = explosion_radius_init
             for i in range(10):
-                x_offset = np.random.random() - 0.5
-                y_offset = np.random.random() - 0.5
+                x_offset = simulator.rng.random() - 0.5
+                y_offset = simulator.rng.random() - 0.5
                 for j in range(i+1):
                     pygame.draw.circle(simulator.window, (255, 255 - 20*i, 0), simulator.position_from_physical(self.position_of_center_of_gravity + Vector(x_offset, y_offset) * explosion_radius_init * 0.5).get(), simulator.scale * explosion_radius)
                 explosion_radius *= 0.5
 
+    def update_and_draw(self, simulator, time_step):
+        self.update(simulator, time_step)
+        self.draw(simulator)
@@ -8,10 +8,17 @@ class Planet(EntityBase):
                  radius=10, density=1, color=(0, 255, 0),
                  athmosphere_radius=1.5, athmosphere_density=1, athmosphere_color=(0, 0, 255), max_wind=0):
         super().__init__(position_init=position_init, orientation_init=0, fixed=True, can_crash=False)
-        self.components.append(
+        self.add_component(
             Athmosphere(self, position_in_entity=Vector(), radius=athmosphere_radius, density=athmosphere_density,
                         color=athmosphere_color, max_wind=max_wind))
-        self.components.append(Sphere(self, position_in_entity=Vector(), radius=radius, density=density, color=color))
+        self.add_component(Sphere(self, position_in_entity=Vector(), radius=radius, density=density, color=color))
+
+
+class Asteroid(EntityBase):
+    def __init__(self, position_init: Vector = Vector(), velocity_init: Vector = Vector(), radius=1, density=1, color=(120, 120, 120)):
+        super().__init__(position_init=position_init, orientation_init=0, fixed=False, can_crash=False)
+        self.velocity = velocity_init.copy()
+        self.add_component(Sphere(self, position_in_entity=Vector(), radius=radius, density=density, color=color))
 
 
 class Rocket(EntityBase):
@@ -20,32 +27,62 @@ class Rocket(EntityBase):
                  height=10, diameter=2, rel_height_pressure_center=0.3,
                  color=(251, 55, 69),#(211, 211, 211),
                  throttle_fn=lambda: 1, vector_fn=lambda: 0,
-                 thruster_left_fn=lambda: 0, thruster_right_fn=lambda: 0):
+                 thruster_left_fn=lambda: 0, thruster_right_fn=lambda: 0,
+                 wing_area=0, wing_fn=lambda: 0):
         super().__init__(position_init=position_init, orientation_init=orientation_init, can_crash=True)
-        self.components.append(RocketBody(self, position_in_entity=Vector(0, 0), orientation_in_entity=0,
+        self.add_component(RocketBody(self, position_in_entity=Vector(0, 0), orientation_in_entity=0,
                                           mass=mass / 10 * 2, moment_of_inertia=0,
                                           height=height, diameter=diameter,
                                           rel_height_pressure_center=rel_height_pressure_center,
                                           lift_coeff=0.5, drag_coeff=0.5, lift_area=height * diameter,
                                           drag_area=np.pi * diameter ** 2 / 4,
                                           color=color))
-        self.components.append(
+        self.add_component(
             Thruster(self, position_in_entity=Vector(0, -height * rel_height_pressure_center), orientation_in_entity=0,
                      input_functions=[throttle_fn, vector_fn],
                      mass=mass / 10, max_thrust=max_thrust))
-        self.components.append(Mass(self, position_in_entity=Vector(0, height * (1 - rel_height_pressure_center - 0.5)),
+        self.add_component(Mass(self, position_in_entity=Vector(0, height * (1 - rel_height_pressure_center - 0.5)),
                                     mass=mass / 10 * 2, moment_of_inertia=0))
-        self.components.append(
+        self.add_component(
             Thruster(self, position_in_entity=Vector(-diameter / 2, 0.65 * height), orientation_in_entity=-np.pi / 2,
                      input_functions=[thruster_left_fn],
                      mass=mass / 10, max_thrust=max_thrust_thrusters))
-        self.components.append(
+        self.add_component(
             Thruster(self, position_in_entity=Vector(diameter / 2, 0.65 * height), orientation_in_entity=np.pi / 2,
                      input_functions=[thruster_right_fn],
                      mass=mass / 10, max_thrust=max_thrust_thrusters))
-        self.components.append(
+        self.add_component(
             LandingLeg(self, position_in_entity=Vector(-diameter, -height * rel_height_pressure_center - 0.4),
                        orientation_in_entity=-0.2, length=0.4, width=0.2))
-        self.components.append(
+        self.add_component(
             LandingLeg(self, position_in_entity=Vector(diameter, -height * rel_height_pressure_center - 0.4),
                        orientation_in_entity=0.2, length=0.4, width=0.2))
+        if wing_area > 0:
+            # fins along the body, chord pointing in flight direction
+            for side in (-1, 1):
+                self.add_component(
+                    Airfoil(self, position_in_entity=Vector(side * diameter / 2, 0.2 * height), orientation_in_entity=-np.pi / 2,
+                            area=wing_area / 2, input_functions=[wing_fn]))
+
+
+def random_planet_parameters(rng, count=4, spread=1000, positions=()):
+    # keyword arguments for randomly placed Planets, drawn from the numpy Generator rng.
+    # candidates closer than five radii to an existing position are dropped
+    planets = []
+    positions = list(positions)
+    for i in range(count):
+        radius = int(rng.integers(5, 50))
+        athmosphere_radius = radius + int(rng.integers(100))
+        position = Vector(rng.integers(-spread, spread), rng.integers(-spread, spread))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        athmosphere_color = tuple([max(0, c - 100) for c in color])
+
+        distances = [(other - position).norm() for other in positions]
+
+        if min(distances, default=np.inf) > 5 * radius:
+            planets.append(dict(position_init=position, radius=radius, density=5 + rng.random() * 10, color=color,
+                                athmosphere_radius=athmosphere_radius, athmosphere_density=rng.random() * 10,
+                                athmosphere_color=athmosphere_color,
+                                max_wind=int(rng.integers(2) * rng.integers(-20, 20))))
+            positions.append(position)
+    return planets
@@ -0,0 +1,191 @@
+import queue
+import numpy as np
+import pygame
+
+
+class InputSnapshot:
+    # Joystick and keyboard state of one step. Reads mirror the pygame joystick and key API and
+    # return 0 for axes, buttons and keys the snapshot does not hold.
+    def __init__(self, time=0, time_step=0, axes=(), buttons=(), keys=()):
+        self.time = time
+        self.time_step = time_step  # of the step the snapshot is used for
+        self.axes = np.asarray(axes, dtype=float)
+        self.buttons = np.asarray(buttons, dtype=int)
+        self.keys = frozenset(keys)  # pressed pygame key codes
+
+    def get_axis(self, index):
+        return self.axes[index] if index < len(self.axes) else 0
+
+    def get_button(self, index):
+        return self.buttons[index] if index < len(self.buttons) else 0
+
+    def get_key(self, key):
+        return int(key in self.keys)
+
+    def get_arrays(self):
+        return dict(time=np.array(self.time, dtype=float), time_step=np.array(self.time_step, dtype=float),
+                    axes=self.axes.copy(), buttons=self.buttons.copy(), keys=np.array(sorted(self.keys), dtype=np.int64))
+
+    @staticmethod
+    def from_arrays(arrays):
+        return InputSnapshot(float(arrays['time']), float(arrays['time_step']), arrays['axes'], arrays['buttons'], arrays['keys'].tolist())
+
+
+class LiveInput:
+    # Samples the joystick, if any, once per step and the keys held according to the KEYDOWN and
+    # KEYUP events handed to handle_event(). Keys are pygame key codes (K_*), as get_key() expects.
+    def __init__(self, joystick=None):
+        self.joystick = joystick
+        self.keys = set()
+
+    def get_state(self):
+        # what simulation snapshots keep of the source: the held keys, the joystick is hardware
+        return dict(keys=np.array(sorted(self.keys), dtype=np.int64))
+
+    def set_state(self, state):
+        self.keys = set(state['keys'].tolist())
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            self.keys.add(event.key)
+        elif event.type == pygame.KEYUP:
+            self.keys.discard(event.key)
+
+    def sample(self, simulator, time_step):
+        axes, buttons = (), ()
+        if self.joystick:
+            axes = [self.joystick.get_axis(k) for k in range(self.joystick.get_numaxes())]
+            buttons = [self.joystick.get_button(k) for k in range(self.joystick.get_numbuttons())]
+        return InputSnapshot(simulator.time, time_step, axes, buttons, self.keys)
+
+
+class QueuedInput:
+    # Hands snapshots sampled by the frames to the physics thread, every step uses the latest one put.
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.latest = InputSnapshot()
+
+    def get_state(self):
+        return self.latest.get_arrays()
+
+    def set_state(self, state):
+        while not self.queue.empty():
+            self.queue.get()
+        self.latest = InputSnapshot.from_arrays(state)
+
+    def put(self, snapshot):
+        self.queue.put(snapshot)
+
+    def sample(self, simulator, time_step):
+        while not self.queue.empty():
+            self.latest = self.queue.get()
+        return InputSnapshot(simulator.time, time_step, self.latest.axes, self.latest.buttons, self.latest.keys)
+
+
+class ScriptedInput:
+    # Schedule of (time, InputSnapshot) breakpoints, each held until the next one.
+    def __init__(self, schedule):
+        self.schedule = sorted(schedule, key=lambda breakpoint: breakpoint[0])
+        self.times = np.array([time for time, _ in self.schedule])
+
+    def get_state(self):
+        return {}  # follows the simulator time
+
+    def set_state(self, state):
+        pass
+
+    def sample(self, simulator, time_step):
+        index = np.searchsorted(self.times, simulator.time + 1e-12, side='right') - 1
+        if index < 0:
+            return InputSnapshot(simulator.time, time_step)
+        snapshot = self.schedule[index][1]
+        return InputSnapshot(simulator.time, time_step, snapshot.axes, snapshot.buttons, snapshot.keys)
+
+
+class InputRecorder:
+    # Passes the snapshots of source through and keeps them for save().
+    def __init__(self, source):
+        self.source = source
+        self.snapshots = []
+
+    def get_state(self):
+        # restoring drops the snapshots recorded after the state was taken
+        return dict(count=np.array(len(self.snapshots)),
+                    **{'source_' + name: array for name, array in self.source.get_state().items()})
+
+    def set_state(self, state):
+        del self.snapshots[int(state['count']):]
+        self.source.set_state({name[len('source_'):]: array for name, array in state.items() if name.startswith('source_')})
+
+    def sample(self, simulator, time_step):
+        snapshot = self.source.sample(simulator, time_step)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def save(self, path):
+        axis_count = max([len(snapshot.axes) for snapshot in self.snapshots], default=0)
+        button_count = max([len(snapshot.buttons) for snapshot in self.snapshots], default=0)
+        key_count = max([len(snapshot.keys) for snapshot in self.snapshots], default=0)
+        axes = np.zeros((len(self.snapshots), axis_count))
+        buttons = np.zeros((len(self.snapshots), button_count), dtype=int)
+        keys = np.full((len(self.snapshots), key_count), -1, dtype=np.int64)  # held key codes, padded with -1
+        for k, snapshot in enumerate(self.snapshots):
+            axes[k, :len(snapshot.axes)] = snapshot.axes
+            buttons[k, :len(snapshot.buttons)] = snapshot.buttons
+            keys[k, :len(snapshot.keys)] = sorted(snapshot.keys)
+        np.savez(path, time=np.array([snapshot.time for snapshot in self.snapshots]),
+                 time_step=np.array([snapshot.time_step for snapshot in self.snapshots]), axes=axes, buttons=buttons, keys=keys)
+
+
+class RecordedInput:
+    # Replays an InputRecorder file snapshot by snapshot, one per step, and holds the last one.
+    # Stepping with the recorded time steps, as replay() does, reproduces the recorded run.
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.times = data['time']
+            self.time_steps = data['time_step']
+            self.axes = data['axes']
+            self.buttons = data['buttons']
+            self.keys = data['keys']
+        self.index = 0
+
+    def get_state(self):
+        return dict(index=np.array(self.index))
+
+    def set_state(self, state):
+        self.index = int(state['index'])
+
+    def sample(self, simulator, time_step):
+        if len(self.times) == 0:
+            return InputSnapshot(simulator.time, time_step)
+        k = min(self.index, len(self.times) - 1)
+        self.index += 1
+        return InputSnapshot(simulator.time, time_step, self.axes[k], self.buttons[k], self.keys[k][self.keys[k] >= 0])
+
+    def replay(self, simulator):
+        # steps simulator with the recorded time steps
+        self.index = 0
+        simulator.input_source = self
+        for time_step in self.time_steps:
+            simulator.step(time_step)
+
+
+if '__main__' == __name__:
+    import os
+    import tempfile
+    from simulator import Simulator
+    live_input = LiveInput()
+    recorder = InputRecorder(live_input)
+    simulator = Simulator(headless=True)
+    simulator.input_source = recorder
+    live_input.handle_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_UP))
+    simulator.step(0.01)
+    assert simulator.input.get_key(pygame.K_UP) and not simulator.input.get_key(pygame.K_DOWN)
+    live_input.handle_event(pygame.event.Event(pygame.KEYUP, key=pygame.K_UP))
+    simulator.step(0.01)
+    assert not simulator.input.get_key(pygame.K_UP)
+    path = os.path.join(tempfile.mkdtemp(), 'input.npz')
+    recorder.save(path)
+    replayed = RecordedInput(path)
+    assert [replayed.sample(simulator, 0.01).get_key(pygame.K_UP) for _ in range(2)] == [1, 0]
+    print('held keys are sampled and replayed by key code')
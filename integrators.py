@@ -0,0 +1,142 @@
+import numpy as np
+
+# Integrators advance all non-fixed, non-crashed entities of a simulator by one time step.
+# Control inputs are evaluated once per step by Simulator.step; integrators only re-evaluate the
+# interaction forces (gravity, wind, contact) through Simulator.compute_interactions. Propulsion
+# is held fixed in the entity frame: intermediate stages rotate it with the stage orientation.
+
+
+def _get_state(entities):
+    return np.array([entity.get_state() for entity in entities], dtype=float).reshape(-1, 6)
+
+def _set_state(entities, state):
+    for entity, entity_state in zip(entities, state):
+        entity.set_state(entity_state)
+
+def _get_propulsion(entities):
+    # global propulsion forces set by the control inputs and the orientations they were set for
+    return [[(component.propulsion_force.x, component.propulsion_force.y) for component in entity.components]
+            for entity in entities], [entity.orientation for entity in entities]
+
+def _rotate_propulsion(entities, propulsion, state):
+    # propulsion forces turned along with the entities from their orientations in propulsion to the ones in state
+    forces, orientations = propulsion
+    for entity, entity_forces, orientation, entity_state in zip(entities, forces, orientations, state):
+        cos, sin = np.cos(entity_state[2] - orientation), np.sin(entity_state[2] - orientation)
+        for component, (x, y) in zip(entity.components, entity_forces):
+            if x or y:
+                component.propulsion_force.x = cos * x - sin * y
+                component.propulsion_force.y = sin * x + cos * y
+
+def _get_derivative(simulator, entities, state, propulsion=None):
+    # time derivative of (x, y, orientation, vx, vy, angular velocity) for every entity
+    _set_state(entities, state)
+    if propulsion:
+        _rotate_propulsion(entities, propulsion, state)
+    simulator.compute_interactions()
+    derivative = np.empty_like(state)
+    derivative[:, :3] = state[:, 3:]
+    for k, entity in enumerate(entities):
+        acceleration, acceleration_angular = entity.get_accelerations()
+        derivative[k, 3:] = (acceleration.x, acceleration.y, acceleration_angular)
+    return derivative
+
+def _restore_crashed(entities, state_init, state):
+    # entities crashing during the step keep their state from the beginning of the step
+    for k, entity in enumerate(entities):
+        if entity.is_crashed:
+            state[k] = state_init[k]
+    return state
+
+
+class SemiImplicitEuler:
+    # symplectic Euler: velocity first, then position with the new velocity
+    def step(self, simulator, time_step):
+        simulator.compute_interactions()
+        for entity in simulator.get_integrated_entities():
+            entity.integrate(time_step)
+
+
+class VelocityVerlet:
+    # kick-drift-kick leapfrog, symplectic and second order
+    def step(self, simulator, time_step):
+        entities = simulator.get_integrated_entities()
+        state_init = _get_state(entities)
+        propulsion = _get_propulsion(entities)
+        derivative = _get_derivative(simulator, entities, state_init)
+        state = state_init.copy()
+        state[:, 3:] += derivative[:, 3:] * time_step / 2
+        state[:, :3] += state[:, 3:] * time_step
+        derivative = _get_derivative(simulator, entities, state, propulsion)
+        state[:, 3:] += derivative[:, 3:] * time_step / 2
+        _rotate_propulsion(entities, propulsion, state_init)
+        _set_state(entities, _restore_crashed(entities, state_init, state))
+
+
+class RK4:
+    def step(self, simulator, time_step):
+        entities = simulator.get_integrated_entities()
+        state_init = _get_state(entities)
+        propulsion = _get_propulsion(entities)
+        k1 = _get_derivative(simulator, entities, state_init)
+        k2 = _get_derivative(simulator, entities, state_init + k1 * time_step / 2, propulsion)
+        k3 = _get_derivative(simulator, entities, state_init + k2 * time_step / 2, propulsion)
+        k4 = _get_derivative(simulator, entities, state_init + k3 * time_step, propulsion)
+        state = state_init + (k1 + 2 * k2 + 2 * k3 + k4) * time_step / 6
+        _rotate_propulsion(entities, propulsion, state_init)
+        _set_state(entities, _restore_crashed(entities, state_init, state))
+
+
+class RK45:
+    # Dormand-Prince 5(4) with adaptive sub-steps. Each simulator step is covered by as many
+    # sub-steps as the error control requires; the last accepted sub-step size carries over.
+    A = (
+        (),
+        (1 / 5,),
+        (3 / 40, 9 / 40),
+        (44 / 45, -56 / 15, 32 / 9),
+        (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+        (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+        (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+    )
+    B = np.array((35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0))
+    B_LOW = np.array((5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40))
+
+    def __init__(self, relative_tolerance=1e-6, absolute_tolerance=1e-6, max_substeps=1000):
+        self.relative_tolerance = relative_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.max_substeps = max_substeps
+        self.substep = None
+        self.substep_count = 0
+
+    def _attempt(self, simulator, entities, state, substep, propulsion):
+        k = []
+        for a in self.A:
+            stage = state + substep * sum((a_j * k_j for a_j, k_j in zip(a, k)), np.zeros_like(state))
+            k.append(_get_derivative(simulator, entities, stage, propulsion))
+        k = np.array(k)
+        state_new = state + substep * np.tensordot(self.B, k, axes=1)
+        error = substep * np.tensordot(self.B - self.B_LOW, k, axes=1)
+        scale = self.absolute_tolerance + self.relative_tolerance * np.maximum(np.abs(state), np.abs(state_new))
+        return state_new, np.sqrt(np.mean((error / scale) ** 2)) if error.size else 0.
+
+    def step(self, simulator, time_step):
+        entities = simulator.get_integrated_entities()
+        state_init = _get_state(entities)
+        propulsion = _get_propulsion(entities)
+        state = state_init
+        proposed = self.substep or time_step
+        self.substep_count = 0
+        t = 0
+        while time_step - t > 1e-12 * time_step:
+            forced = self.substep_count >= self.max_substeps
+            substep = time_step - t if forced else min(proposed, time_step - t)
+            state_new, error = self._attempt(simulator, entities, state, substep, propulsion)
+            self.substep_count += 1
+            if error <= 1 or forced:
+                t += substep
+                state = state_new
+            proposed = substep * min(5, max(0.2, 0.9 * max(error, 1e-12) ** -0.2))
+        self.substep = proposed
+        _rotate_propulsion(entities, propulsion, state_init)
+        _set_state(entities, _restore_crashed(entities, state_init, state))
@@ -0,0 +1,187 @@
+import numpy as np
+from component_base import ComponentBase, GRAVITATIONAL_CONSTANT
+from broad_phase import SweepAndPrune
+
+
+class InteractionEngine:
+    # Batched replacement for ComponentBase._compute_interactions. Component state is packed into
+    # contiguous arrays once per step and every unordered pair of components is evaluated once.
+    def __init__(self, static_field=None, gravity_solver=None):
+        self.components = []
+        self._layout_key = None
+        self.broad_phase = SweepAndPrune()
+        self.static_field = static_field  # StaticField replacing gravity and wind of fixed entities
+        self.gravity_solver = gravity_solver  # BarnesHut replacing the pairwise gravity
+
+    def _build_layout(self, entities):
+        self.components = [component for entity in entities for component in entity.components]
+        n = len(self.components)
+        self.entity_index = np.array([i for i, entity in enumerate(entities) for _ in entity.components], dtype=int)
+        self.masses = np.array([component.mass for component in self.components], dtype=float)
+        self.bounding_radii = np.array([component.bounding_radius or 0 for component in self.components], dtype=float)
+
+        self.fixed = np.array([component.entity.fixed for component in self.components], dtype=bool)
+        # fixed entities act through the static field, if there is one
+        self.gravity_sources = np.flatnonzero((self.masses != 0) & ~(self.fixed & bool(self.static_field)))
+        if self.gravity_solver:
+            self.gravity_pairs = (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+        else:
+            i, j = np.triu_indices(n, 1)
+            other_entity = self.entity_index[i] != self.entity_index[j]
+            i, j = i[other_entity], j[other_entity]
+            if self.static_field:
+                moving = ~self.fixed[i] & ~self.fixed[j]
+                i, j = i[moving], j[moving]
+            has_mass = (self.masses[i] != 0) & (self.masses[j] != 0)
+            self.gravity_pairs = (i[has_mass], j[has_mass])
+
+        self.colliders = np.flatnonzero(self.bounding_radii > 0)
+
+        # wind is directed: emitters are components overriding get_wind_emitted_at,
+        # receivers are components overriding _compute_aerodynamic_forces
+        self.emitters = [k for k, c in enumerate(self.components)
+                         if type(c).get_wind_emitted_at is not ComponentBase.get_wind_emitted_at
+                         and not (self.static_field and self.fixed[k])]
+        self.receivers = np.array([k for k, c in enumerate(self.components)
+                                   if type(c)._compute_aerodynamic_forces is not ComponentBase._compute_aerodynamic_forces], dtype=int)
+
+    def _pack_state(self):
+        n = len(self.components)
+        self.positions = np.empty((n, 2))
+        self.velocities = np.empty((n, 2))
+        for k, component in enumerate(self.components):
+            self.positions[k] = component.get_global_position().get()
+            self.velocities[k] = component.get_global_velocity().get()
+        self.entity_masses = np.array([component.entity.get_total_mass() for component in self.components], dtype=float)
+
+    def update(self, simulator):
+        # adds gravitational, aerodynamic and contact forces to the components of all awake dynamic entities.
+        # Fixed and sleeping entities still act on the others but receive nothing
+        layout_key = tuple((id(component), entity.fixed) for entity in simulator.entities for component in entity.components)
+        if layout_key != self._layout_key:
+            self._build_layout(simulator.entities)
+            self._layout_key = layout_key
+        if self.static_field:
+            self.static_field.update(simulator.entities)
+
+        if len(self.components) == 0:
+            return
+        self._pack_state()
+        self.receiving = np.array([not (entity.fixed or entity.is_sleeping) for entity in simulator.entities],
+                                  dtype=bool)[self.entity_index]
+
+        profiler = simulator.profiler
+        start = profiler.start()
+        gravitational_forces = self._compute_gravity()
+        if self.static_field:
+            k = np.flatnonzero(self.receiving)
+            gravitational_forces[k] += self.masses[k, None] * self.static_field.get_gravitational_acceleration(self.positions[k])
+        receiving = np.flatnonzero(self.receiving)
+        for k, (x, y) in zip(receiving, gravitational_forces[receiving].tolist()):
+            self.components[k].add_force('gravitational', x, y)
+        profiler.stop('interactions/gravity', start)
+        profiler.count('pair_tests', len(self.gravity_pairs[0]))
+
+        start = profiler.start()
+        self._compute_aerodynamics()
+        profiler.stop('interactions/aerodynamics', start)
+
+        start = profiler.start()
+        self._compute_contacts(profiler)
+        profiler.stop('interactions/contact', start)
+
+    def _compute_gravity(self):
+        if self.gravity_solver:
+            return self._compute_gravity_with_solver()
+        i, j = self.gravity_pairs
+        receiving = self.receiving[i] | self.receiving[j]
+        i, j = i[receiving], j[receiving]
+        forces = np.zeros((len(self.components), 2))
+        d_position = self.positions[j] - self.positions[i]
+        distance_squared = d_position[:, 0]**2 + d_position[:, 1]**2
+        magnitude = GRAVITATIONAL_CONSTANT * (self.masses[i] * self.masses[j]) / np.maximum(distance_squared, 1)
+        force = d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[:, None]
+        # Newton's third law: the force of i on j is the negated force of j on i
+        np.add.at(forces, i, force)
+        np.add.at(forces, j, -force)
+        return forces
+
+    def _compute_gravity_with_solver(self):
+        forces = np.zeros((len(self.components), 2))
+        sources = self.gravity_sources
+        targets = np.flatnonzero(self.receiving & (self.masses != 0))
+        if len(sources) == 0 or len(targets) == 0:
+            return forces
+        self.gravity_solver.build(self.positions[sources], self.masses[sources], self.entity_index[sources])
+        accelerations = self.gravity_solver.compute_accelerations(self.positions[targets], self.entity_index[targets])
+        forces[targets] = self.masses[targets, None] * accelerations
+        return forces
+
+    def _compute_aerodynamics(self):
+        receivers = self.receivers[self.receiving[self.receivers]]
+        if len(receivers) == 0:
+            return
+        receiver_positions = self.positions[receivers]
+        receiver_velocities = self.velocities[receivers]
+        for e in self.emitters:
+            emitter = self.components[e]
+            winds = emitter.get_wind_emitted_at(receiver_positions, receiver_velocities)
+            active = np.flatnonzero((self.entity_index[receivers] != self.entity_index[e])
+                                    & np.any(winds != 0, axis=1))
+            self._apply_winds(receivers[active], winds[active])
+        if self.static_field:
+            winds = self.static_field.get_wind(self.positions[receivers], self.velocities[receivers])
+            active = np.flatnonzero(np.any(winds != 0, axis=1))
+            self._apply_winds(receivers[active], winds[active])
+
+    def _apply_winds(self, receiver_indices, winds):
+        if len(receiver_indices) == 0:
+            return
+        receivers = [self.components[k] for k in receiver_indices]
+        for receiver_class in {type(receiver) for receiver in receivers}:
+            group = [k for k, receiver in enumerate(receivers) if type(receiver) is receiver_class]
+            forces = receiver_class._compute_aerodynamic_forces_batch([receivers[k] for k in group], winds[group])
+            for k, (x, y) in zip(group, forces.tolist()):
+                receivers[k].add_force('aerodynamic', x, y)
+
+    def _compute_contacts(self, profiler):
+        # broad phase: only overlapping bounding boxes of different entities reach the narrow phase
+        i, j = self.broad_phase.find_pairs(self.positions[self.colliders], self.bounding_radii[self.colliders])
+        i, j = self.colliders[i], self.colliders[j]
+        relevant = (self.entity_index[i] != self.entity_index[j]) & (self.receiving[i] | self.receiving[j])
+        i, j = i[relevant], j[relevant]
+        profiler.count('pair_tests', len(i))
+        if len(i) == 0:
+            return
+        d_position = self.positions[j] - self.positions[i]
+        distance = np.sqrt(d_position[:, 0]**2 + d_position[:, 1]**2)
+        bounding_distance = distance - (self.bounding_radii[i] + self.bounding_radii[j])
+        touching = np.flatnonzero(bounding_distance < 0)
+        if len(touching) == 0:
+            return
+
+        profiler.count('contacts', len(touching))
+        i, j = i[touching], j[touching]
+        d_position, distance = d_position[touching], distance[touching]
+        penetration_depth = -bounding_distance[touching]
+        d_velocity = self.velocities[j] - self.velocities[i]
+        speed = np.sqrt(d_velocity[:, 0]**2 + d_velocity[:, 1]**2)
+        velocity_radial = (d_velocity[:, 0] * d_position[:, 0] + d_velocity[:, 1] * d_position[:, 1]) / distance
+        unit = d_position / np.maximum(distance, 1e-3)[:, None]
+        magnitude = 100 * (penetration_depth - 1e-2 * velocity_radial)
+
+        for k in range(len(i)):
+            component_i, component_j = self.components[i[k]], self.components[j[k]]
+            if speed[k] > 5:
+                component_i.entity.crash()
+                component_j.entity.crash()
+                continue
+            force = unit[k] * magnitude[k]
+            if self.receiving[i[k]]:
+                component_i.add_force('contact', -force[0] * self.entity_masses[i[k]], -force[1] * self.entity_masses[i[k]])
+            elif component_i.entity.is_sleeping:
+                component_i.entity.wake()
+            if self.receiving[j[k]]:
+                component_j.add_force('contact', force[0] * self.entity_masses[j[k]], force[1] * self.entity_masses[j[k]])
+            elif component_j.entity.is_sleeping:
+                component_j.entity.wake()
@@ -0,0 +1,104 @@
+import math
+import numpy as np
+
+
+def stumpff(z):
+    # Stumpff functions C(z) and S(z) of the universal variable formulation
+    if z > 1e-6:
+        s = math.sqrt(z)
+        return (1 - math.cos(s)) / z, (s - math.sin(s)) / s**3
+    if z < -1e-6:
+        s = math.sqrt(-z)
+        return (math.cosh(s) - 1) / -z, (math.sinh(s) - s) / s**3
+    return 1 / 2 - z / 24 + z**2 / 720, 1 / 6 - z / 120 + z**2 / 5040
+
+
+def _get_time_of_flight(chi, r0, vr0, alpha, sqrt_mu):
+    # time to reach the universal anomaly chi, times sqrt(mu), and its derivative, the radius
+    z = alpha * chi**2
+    c, s = stumpff(z)
+    time = r0 * vr0 / sqrt_mu * chi**2 * c + (1 - alpha * r0) * chi**3 * s + r0 * chi
+    radius = r0 * vr0 / sqrt_mu * chi * (1 - z * s) + (1 - alpha * r0) * chi**2 * c + r0
+    return time, radius
+
+
+def propagate(position, velocity, mu, time, tolerance=1e-12, max_iterations=100):
+    # two-body motion of a test mass around a fixed point mass mu at the origin over time, for
+    # elliptic, parabolic and hyperbolic orbits. Returns the position and velocity as arrays
+    position = np.asarray(position, dtype=float)
+    velocity = np.asarray(velocity, dtype=float)
+    r0 = math.hypot(position[0], position[1])
+    v0 = math.hypot(velocity[0], velocity[1])
+    vr0 = (position[0] * velocity[0] + position[1] * velocity[1]) / r0
+    sqrt_mu = math.sqrt(mu)
+    alpha = 2 / r0 - v0**2 / mu  # inverse of the semi-major axis
+    if alpha > 1e-12:
+        time = math.fmod(time, 2 * math.pi / (sqrt_mu * alpha**1.5))  # whole periods change nothing
+
+    # the time of flight grows monotonically with chi: bracket the root, then Newton with bisection fallback
+    target = sqrt_mu * time
+    lower, upper = -math.inf, math.inf
+    if alpha > 1e-12:
+        chi = sqrt_mu * alpha * time
+    elif alpha < -1e-12:
+        upper = 700 / math.sqrt(-alpha)  # beyond, cosh overflows, and the time would be astronomic anyway
+        lower = -upper
+        semi_major_axis = 1 / alpha
+        sign = 1 if time >= 0 else -1
+        argument = -2 * mu * alpha * time / (r0 * vr0 + sign * math.sqrt(-mu * semi_major_axis) * (1 - r0 * alpha))
+        chi = sign * math.sqrt(-semi_major_axis) * math.log(argument) if argument > 0 else 0
+        chi = min(max(chi, lower), upper)
+    else:
+        chi = target / r0
+    for _ in range(max_iterations):
+        value, radius = _get_time_of_flight(chi, r0, vr0, alpha, sqrt_mu)
+        error = value - target
+        if abs(error) <= tolerance * max(abs(target), r0):
+            break
+        if error > 0:
+            upper = min(upper, chi)
+        else:
+            lower = max(lower, chi)
+        step = chi - error / radius
+        if lower < step < upper:
+            chi = step
+        elif math.isfinite(lower) and math.isfinite(upper):
+            chi = (lower + upper) / 2
+        elif error < 0:
+            chi = lower + max(1, abs(lower))
+        else:
+            chi = upper - max(1, abs(upper))
+
+    z = alpha * chi**2
+    c, s = stumpff(z)
+    f = 1 - chi**2 / r0 * c
+    g = time - chi**3 / sqrt_mu * s
+    new_position = f * position + g * velocity
+    r = math.hypot(new_position[0], new_position[1])
+    f_dot = sqrt_mu / (r * r0) * (z * s - 1) * chi
+    g_dot = 1 - chi**2 / r * c
+    return new_position, f_dot * position + g_dot * velocity
+
+
+if '__main__' == __name__:
+    import time
+    mu = 3e4
+    rng = np.random.default_rng(0)
+    for name, speed in (('ellipse', 0.8), ('parabola', math.sqrt(2)), ('hyperbola', 2)):
+        position = np.array((200., 0.))
+        velocity = np.array((0.1, speed * math.sqrt(mu / 200)))
+        # reference by small steps of a fourth order Runge-Kutta integrator
+        state = np.concatenate((position, velocity))
+        derivative = lambda state: np.concatenate((state[2:], -mu * state[:2] / np.linalg.norm(state[:2])**3))
+        step = 0.01
+        for _ in range(5000):
+            k1 = derivative(state)
+            k2 = derivative(state + k1 * step / 2)
+            k3 = derivative(state + k2 * step / 2)
+            k4 = derivative(state + k3 * step)
+            state = state + (k1 + 2 * k2 + 2 * k3 + k4) * step / 6
+        start = time.perf_counter()
+        new_position, new_velocity = propagate(position, velocity, mu, 50)
+        elapsed = time.perf_counter() - start
+        print('{:9s}: position error {:.1e}, velocity error {:.1e}, {:.0f} us'.format(
+            name, np.linalg.norm(new_position - state[:2]), np.linalg.norm(new_velocity - state[2:]), elapsed * 1e6))
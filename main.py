@@ -1,7 +1,8 @@
+import pygame
 from simulator import Simulator
 from entity_library import *
 from component_library import *
-from pid_controller import PIDController
+from pid_controller import PIDControllerBank
 
 # TODO: first, do rockets only, implement aerodynamics a bit later with athmosphere
 
@@ -11,6 +12,7 @@ if '__main__' == __name__:
     WINDOW_WIDTH = 2000
 
     RANGE = 1000
+    SEED = None  # set to an integer for a reproducible map
 
     s = Simulator(window_size=(WINDOW_WIDTH, WINDOW_HEIGHT), scale_init=100)
     s.camera_center = Vector(0, 0)
@@ -20,31 +22,25 @@ if '__main__' == __name__:
                         athmosphere_radius=200, athmosphere_density=1, athmosphere_color=(100, 100, 255), max_wind=0))
 
     # add other planets randomly
-    for i in range(4):
-        radius = np.random.randint(5, 50)
-        athmosphere_radius = radius + np.random.randint(100)
-        position = Vector(np.random.randint(-RANGE, RANGE), np.random.randint(-RANGE, RANGE))
-        color = tuple([np.random.randint(0, 256) for _ in range(3)])
-        athmosphere_color = tuple([max(0, c - 100) for c in color])
-
-        distances = [(entity.position_of_center_of_gravity - position).norm() for entity in s.entities]
-
-        if min(distances) > 5 * radius:
-            s.add_entity(Planet(position_init=position, radius=radius, density=5 + np.random.rand() * 10, color=color,
-                                athmosphere_radius=athmosphere_radius, athmosphere_density=np.random.rand() * 10, athmosphere_color=athmosphere_color,
-                                max_wind=np.random.randint(2) * np.random.randint(-20, 20)))
-
-    pid1 = PIDController(k_proportional=0.5, k_integral=0, k_derivative=0)
-    pid2 = PIDController(k_proportional=0, k_integral=0, k_derivative=0)
-    pid3 = PIDController(k_proportional=0, k_integral=0, k_derivative=0)
-    pid4 = PIDController(k_proportional=0, k_integral=0, k_derivative=0)
+    rng = np.random.default_rng(SEED)
+    for planet_parameters in random_planet_parameters(rng, count=4, spread=RANGE,
+                                                      positions=[entity.position_of_center_of_gravity for entity in s.entities]):
+        s.add_entity(Planet(**planet_parameters))
+
+    # inputs are read from the per step snapshot s.input, the stabilizing controllers are evaluated together
+    controllers = s.add_controller_bank(PIDControllerBank())
+    vector_pid = controllers.add(0.5, 0, 0, signal_fn=lambda: -rocket.velocity_angular, target_fn=lambda: -s.input.get_axis(0))
+    left_pid = controllers.add(0, 0, 0, signal_fn=lambda: -rocket.velocity_angular)
+    right_pid = controllers.add(0, 0, 0, signal_fn=lambda: rocket.velocity_angular)
     s.add_entity(rocket := Rocket(position_init=Vector(0, -3), orientation_init=np.pi,
                                   mass=100, max_thrust=250, max_thrust_thrusters=100,
                                   height=2, diameter=0.3, rel_height_pressure_center=0.2,
-                                  throttle_fn=lambda: -1 * (s.joystick.get_axis(3) - 1) / 2,
-                                  vector_fn=lambda: pid1.get(-rocket.velocity_angular, -s.joystick.get_axis(0)),
-                                  thruster_left_fn=lambda: s.joystick.get_button(2) + (1 if pid2.get(-rocket.velocity_angular, 0) > 0.3 else 0),
-                                  thruster_right_fn=lambda: s.joystick.get_button(3) + (1 if pid3.get(rocket.velocity_angular, 0) > 0.3 else 0)))
+                                  # full throttle on space without a joystick throttle axis
+                                  throttle_fn=lambda: -1 * (s.input.get_axis(3) - 1) / 2 if len(s.input.axes) > 3
+                                  else s.input.get_key(pygame.K_SPACE),
+                                  vector_fn=controllers.get_output_fn(vector_pid),
+                                  thruster_left_fn=lambda: s.input.get_button(2) + (1 if controllers.outputs[left_pid] > 0.3 else 0),
+                                  thruster_right_fn=lambda: s.input.get_button(3) + (1 if controllers.outputs[right_pid] > 0.3 else 0)))
 
     s.track(rocket)
     s.run(60)
@@ -10,16 +10,61 @@ class PIDController():
         self.error_last = 0
         self.error_integrated = 0
 
-    def get(self, signal, target):
+    def get(self, signal, target, time_step=None):
+        # without time_step the integral and derivative are per call, as tuned so far
         error = target - signal
-        self.error_integrated += error
-        error_derivative = error - self.error_last
+        if time_step is None:
+            self.error_integrated += error
+            error_derivative = error - self.error_last
+        else:
+            self.error_integrated += error * time_step
+            error_derivative = (error - self.error_last) / time_step
+        self.error_last = error
         output = self.k_proportional * error \
                  + self.k_integral * self.error_integrated \
                  + self.k_derivative * error_derivative
         # print('signal: {}, error: {}, integrated: {}, derivative: {}, output: {}'.format(signal, error, self.error_integrated, error_derivative, output))
         return output
 
+
+class PIDControllerBank(PIDController):
+    # Many PID controllers evaluated as one array operation. Every controller polls a signal and a
+    # target function in update(), which the simulator calls once per step before the control inputs,
+    # and input functions read the outputs through get_output_fn().
+    def __init__(self):
+        super().__init__(np.zeros(0), np.zeros(0), np.zeros(0))
+        self.error_last = np.zeros(0)
+        self.error_integrated = np.zeros(0)
+        self.outputs = np.zeros(0)
+        self.signal_fns = []
+        self.target_fns = []
+
+    def add(self, k_proportional, k_integral=0, k_derivative=0, signal_fn=lambda: 0, target_fn=lambda: 0):
+        self.k_proportional = np.append(self.k_proportional, k_proportional)
+        self.k_integral = np.append(self.k_integral, k_integral)
+        self.k_derivative = np.append(self.k_derivative, k_derivative)
+        self.error_last = np.append(self.error_last, 0)
+        self.error_integrated = np.append(self.error_integrated, 0)
+        self.outputs = np.append(self.outputs, 0)
+        self.signal_fns.append(signal_fn)
+        self.target_fns.append(target_fn)
+        return len(self.signal_fns) - 1
+
+    def reset(self):
+        self.error_last[:] = 0
+        self.error_integrated[:] = 0
+        self.outputs[:] = 0
+
+    def update(self, time_step=None):
+        n = len(self.signal_fns)
+        signals = np.fromiter((signal_fn() for signal_fn in self.signal_fns), dtype=float, count=n)
+        targets = np.fromiter((target_fn() for target_fn in self.target_fns), dtype=float, count=n)
+        self.outputs = self.get(signals, targets, time_step)
+
+    def get_output_fn(self, index):
+        return lambda: self.outputs[index]
+
+
 if '__main__' == __name__:
     n = 100
     target = np.ones(n)
@@ -18,8 +18,8 @@ class PolygonShape():
 
     def translate(self, translation: Vector):
         t = np.eye(3)
-        t[0, 2] = translation.data[0]
-        t[1, 2] = translation.data[1]
+        t[0, 2] = translation.x
+        t[1, 2] = translation.y
         return self.transform(t)
 
     def rotate(self, angle):
@@ -29,16 +29,13 @@ class PolygonShape():
         return self.transform(t)
 
     def to_simulator(self, simulator):
-        return self.translate(-simulator.camera_center)\
-            .scale(simulator.scale)\
-            .translate(Vector(simulator.window_size[0], simulator.window_size[1]) / 2)\
-            .get_pairs()
+        return self.transform(simulator.get_screen_transform()).get_pairs()
 
     def get(self):
         return self.points
 
     def get_pairs(self):
-        return [(self.points[0, i], self.points[1, i]) for i in range(self.points.shape[1])]
+        return self.points[:2].T.tolist()
 
     def __str__(self):
         return str(self.points)
@@ -53,6 +50,17 @@ def translate_polygon(polygon_shape, vector: Vector):
 def rotate_polygon(polygon_shape, angle):
     return [pt.rotate(angle) for pt in polygon_shape]
 
+def transform_polygons(polygons, transformation_matrix: np.array):
+    # transforms the points of all (points, color) polygons with a single matrix product
+    points = transformation_matrix.dot(np.concatenate([points for points, _ in polygons], axis=1))[:2].T.tolist()
+    transformed = []
+    start = 0
+    for polygon, color in polygons:
+        end = start + polygon.shape[1]
+        transformed.append((points[start:end], color))
+        start = end
+    return transformed
+
 def make_pairs(polygon_shape):
     return [(v[0], v[1]) for v in polygon_shape]
 
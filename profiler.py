@@ -0,0 +1,67 @@
+import csv
+import json
+import sys
+import time
+
+
+class Profiler:
+    # Accumulates wall-clock time per phase and event counters. When disabled, start() and
+    # stop() return immediately and hot loops check enabled before doing any per-item work.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.timings = {}  # phase -> [total seconds, calls]
+        self.counters = {}
+        self._allocated_blocks = sys.getallocatedblocks()
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def stop(self, phase, start):
+        if self.enabled:
+            timing = self.timings.setdefault(phase, [0., 0])
+            timing[0] += time.perf_counter() - start
+            timing[1] += 1
+
+    def count(self, counter, n=1):
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def count_allocations(self):
+        # net growth of allocated interpreter memory blocks since the last call
+        if self.enabled:
+            allocated_blocks = sys.getallocatedblocks()
+            self.count('allocated_blocks', allocated_blocks - self._allocated_blocks)
+            self._allocated_blocks = allocated_blocks
+
+    def get_report(self):
+        steps = max(self.counters.get('steps', 0), 1)
+        return dict(phases={phase: dict(total_s=total, calls=calls, per_step_ms=total / steps * 1000)
+                            for phase, (total, calls) in sorted(self.timings.items())},
+                    counters=dict(self.counters))
+
+    def to_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.get_report(), file, indent=2)
+
+    def to_csv(self, path):
+        report = self.get_report()
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('name', 'total_s', 'calls', 'per_step_ms'))
+            for phase, timing in report['phases'].items():
+                writer.writerow((phase, timing['total_s'], timing['calls'], timing['per_step_ms']))
+            for counter, value in report['counters'].items():
+                writer.writerow((counter, '', value, ''))
+
+    def draw_overlay(self, window, font, position=(10, 10), lines=20, column_width=260):
+        report = self.get_report()
+        phases = sorted(report['phases'].items(), key=lambda item: -item[1]['total_s'])[:lines]
+        rows = [(phase, '{:.3f} ms'.format(timing['per_step_ms'])) for phase, timing in phases]
+        rows += [(counter, str(value)) for counter, value in sorted(report['counters'].items())]
+        for i, (name, value) in enumerate(rows):
+            y = position[1] + i * font.get_linesize()
+            window.blit(font.render(name, False, (255, 255, 255)), (position[0], y))
+            window.blit(font.render(value, False, (255, 255, 255)), (position[0] + column_width, y))
@@ -0,0 +1,137 @@
+import json
+import numpy as np
+from input_snapshot import InputSnapshot
+
+# A snapshot holds the mutable state of a simulator in flat arrays: entity kinematics and flags,
+# component orientations and thruster throttles, the memory of registered PID controllers, the
+# random generator, the time, the time warp with its remainder, the integrator substep, the input
+# of the current step and the state of the input source (held keys, latest queued input,
+# replay position). Input functions, meshes and other structure stay in the simulator, so a
+# snapshot restores into the simulator it was taken from or into any simulator built the same
+# way. Forces are not stored, the next step recomputes them. Joysticks are hardware and not stored.
+
+
+def get_layout(simulator):
+    # entity and component types, restoring into a different layout is refused
+    return ';'.join(type(entity).__name__ + ':' + ','.join(type(component).__name__ for component in entity.components)
+                    for entity in simulator.entities)
+
+
+class SimulationSnapshot:
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def copy(self):
+        return SimulationSnapshot({name: array.copy() for name, array in self.arrays.items()})
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            np.savez(file, **self.arrays)
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return SimulationSnapshot({name: data[name] for name in data.files})
+
+    @staticmethod
+    def take(simulator):
+        entities = simulator.entities
+        components = [component for entity in entities for component in entity.components]
+        controllers = simulator.controller_banks + simulator.controllers
+        error_last = [np.ravel(controller.error_last).astype(float) for controller in controllers]
+        error_integrated = [np.ravel(controller.error_integrated).astype(float) for controller in controllers]
+        substep = getattr(simulator.integrator, 'substep', None)
+        source = simulator.input_source
+        inputs = {'input_' + name: array for name, array in simulator.input.get_arrays().items()}
+        inputs.update({'input_source_' + name: array for name, array in (source.get_state() if source else {}).items()})
+        return SimulationSnapshot(dict(
+            time_warp=np.array(simulator.time_warp),
+            warp_remainder=np.array(simulator.warp_remainder, dtype=float),
+            input_source_type=np.array(type(source).__name__ if source else ''),
+            **inputs,
+            layout=np.array(get_layout(simulator)),
+            time=np.array(simulator.time, dtype=float),
+            rng_state=np.array(json.dumps(simulator.rng.bit_generator.state)),
+            integrator_substep=np.array(np.nan if substep is None else substep, dtype=float),
+            entity_state=np.array([entity.get_state() for entity in entities], dtype=float).reshape(-1, 6),
+            is_crashed=np.array([entity.is_crashed for entity in entities], dtype=bool),
+            is_sleeping=np.array([entity.is_sleeping for entity in entities], dtype=bool),
+            sleep_timer=np.array([entity.sleep_timer for entity in entities], dtype=float),
+            orientation_in_entity=np.array([component.orientation_in_entity for component in components], dtype=float),
+            throttle=np.array([getattr(component, 'throttle', np.nan) for component in components], dtype=float),
+            controller_sizes=np.array([len(error) for error in error_last], dtype=int),
+            controller_error_last=np.concatenate(error_last) if controllers else np.zeros(0),
+            controller_error_integrated=np.concatenate(error_integrated) if controllers else np.zeros(0)))
+
+    def restore(self, simulator):
+        assert str(self['layout']) == get_layout(simulator), 'snapshot was taken from a differently built simulator'
+        controllers = simulator.controller_banks + simulator.controllers
+        assert len(controllers) == len(self['controller_sizes']), 'snapshot has a different number of controllers'
+        simulator.time = float(self['time'])
+        if 'time_warp' in self.arrays:  # missing in snapshots saved before it was stored
+            simulator.time_warp = self['time_warp'].item()
+            simulator.warp_remainder = float(self.arrays.get('warp_remainder', 0))
+            source = simulator.input_source
+            assert str(self['input_source_type']) == (type(source).__name__ if source else ''), \
+                'snapshot was taken with a different input source'
+            simulator.input = InputSnapshot.from_arrays({name[len('input_'):]: array for name, array in self.arrays.items()
+                                                         if name.startswith('input_') and not name.startswith('input_source_')})
+            if source:
+                source.set_state({name[len('input_source_'):]: array for name, array in self.arrays.items()
+                                  if name.startswith('input_source_') and name != 'input_source_type'})
+        simulator.rng.bit_generator.state = json.loads(str(self['rng_state']))
+        if hasattr(simulator.integrator, 'substep'):
+            substep = float(self['integrator_substep'])
+            simulator.integrator.substep = None if np.isnan(substep) else substep
+
+        entity_state = self['entity_state']
+        for k, entity in enumerate(simulator.entities):
+            entity.set_state(entity_state[k])
+            entity.is_crashed = bool(self['is_crashed'][k])
+            entity.is_sleeping = bool(self['is_sleeping'][k])
+            entity.sleep_timer = float(self['sleep_timer'][k])
+
+        components = [component for entity in simulator.entities for component in entity.components]
+        for component, orientation, throttle in zip(components, self['orientation_in_entity'], self['throttle']):
+            component.orientation_in_entity = float(orientation)
+            if not np.isnan(throttle):
+                component.throttle = float(throttle)
+
+        offsets = np.cumsum(np.append(0, self['controller_sizes']))
+        for controller, start, end in zip(controllers, offsets[:-1], offsets[1:]):
+            error_last = self['controller_error_last'][start:end].copy()
+            error_integrated = self['controller_error_integrated'][start:end].copy()
+            if np.ndim(controller.error_last) == 0 and end - start == 1:  # scalar PIDController
+                error_last, error_integrated = float(error_last[0]), float(error_integrated[0])
+            controller.error_last = error_last
+            controller.error_integrated = error_integrated
+
+
+
+if '__main__' == __name__:
+    import time
+    from simulator import Simulator
+    from entity_library import Planet, Rocket
+    from pid_controller import PIDController
+    from vector import Vector
+    simulator = Simulator(headless=True, seed=0)
+    simulator.add_entity(Planet(position_init=Vector(0, 100), radius=100, density=5, athmosphere_radius=200))
+    pid = simulator.add_controller(PIDController(0.5))
+    burn = dict(throttle=0)
+    simulator.add_entity(rocket := Rocket(position_init=Vector(0, -20), orientation_init=np.pi, mass=100, max_thrust=250,
+                                          max_thrust_thrusters=100, height=2, diameter=0.3, rel_height_pressure_center=0.2,
+                                          throttle_fn=lambda: burn['throttle'], vector_fn=lambda: pid.get(-rocket.velocity_angular, 0)))
+    simulator.advance(2, 0.01)
+    snapshot = simulator.snapshot()
+    snapshot.save('snapshot.npz')
+    for throttle in (0.3, 0.6, 0.9):
+        start = time.perf_counter()
+        simulator.restore(SimulationSnapshot.load('snapshot.npz'))
+        elapsed = time.perf_counter() - start
+        burn['throttle'] = throttle
+        simulator.advance(6, 0.01)
+        print('throttle {}: restored in {:.2f} ms, crashed {}, speed {:.2f}'.format(
+            throttle, elapsed * 1000, rocket.is_crashed, rocket.velocity.norm()))
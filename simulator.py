@@ -1,31 +1,136 @@
+import copy
+import time
+import threading
 import pygame
 import numpy as np
 from vector import Vector
+from interaction_engine import InteractionEngine
+from integrators import SemiImplicitEuler
+from profiler import Profiler
+from circle_renderer import CircleRenderer
+from audio import ChannelPool
+from static_field import StaticField
+from barnes_hut import BarnesHut
+from input_snapshot import InputSnapshot, LiveInput, QueuedInput
+from simulation_snapshot import SimulationSnapshot
+from trajectory_predictor import TrajectoryPredictor
+from time_warp import OnRails
 
 class Simulator:
-    def __init__(self, window_size=(100, 100), scale_init: float = 1):
+    def __init__(self, window_size=(100, 100), scale_init: float = 1, headless=False, vectorized=True, seed=None,
+                 integrator=None, profile=False, audio=None, max_audio_channels=8, static_field=False,
+                 allow_sleep=True, barnes_hut_theta=None):
         self.entities = []
+        self.static_entities = []  # fixed entities, never receive forces
+        self.dynamic_entities = []
+        self.allow_sleep = allow_sleep
+        self.sleep_velocity = 0.05
+        self.sleep_velocity_angular = 0.05
+        self.sleep_time = 0.5
+        self.time = 0
+        self.rng = np.random.default_rng(seed)
         self.camera_center = Vector()
         self.window_size = window_size
         self.scale_min = 1
         self.scale_max = 1000
+        self.lod_pixels = 3  # entities smaller than this on screen are drawn as a dot
         self.scale = scale_init
         self.auto_scale = False
         self.tracked_entity = None
+        self.trajectory_predictor = TrajectoryPredictor()  # path of the tracked entity drawn by run(), None to disable
+        self.joystick = None
+        self.input_source = None  # sampled into self.input once per step, fed by the frames while running
+        self.input = InputSnapshot()
+        self.controller_banks = []  # PIDControllerBanks updated once per step
+        self.controllers = []  # other PIDControllers whose memory is part of snapshots
+        self.recorder = None  # TrajectoryRecorder receiving a frame after every step
+        self.force_breakdown = False  # keep per source forces on every component, for debugging
+        self.time_warp = 1  # steps are this much longer while all entities coast on rails, falls back to 1 otherwise
+        self.max_time_warp = 10000
+        self.warp_remainder = 0  # warped time a step fell short by when an entity ran out of substeps, added to the next
+        self.on_rails = OnRails()
+        self.headless = headless
+        self._screen_transform_key = None
+        self.circle_renderer = CircleRenderer()
+        # static_field samples gravity and wind of fixed entities from a precomputed grid,
+        # barnes_hut_theta replaces the pairwise gravity by a quadtree with that opening angle
+        self.interaction_engine = InteractionEngine(StaticField() if static_field else None,
+                                                    None if barnes_hut_theta is None else BarnesHut(barnes_hut_theta)) \
+            if vectorized else None
+        self.integrator = integrator or SemiImplicitEuler()
+        self.profiler = Profiler(enabled=profile)
+        self.show_profiler_overlay = profile
+        self._profiler_font = None
+        self.audio = None  # ChannelPool, None without audio
 
-        pygame.init()
-        pygame.mixer.init()
-        pygame.mixer.music.load('a_theme_for_space.mp3')
+        # headless simulators never touch display, joystick or mixer
+        # the mixer is only started for audio and never quit, other simulators may be using it
+        if not self.headless:
+            pygame.display.init()
+            pygame.joystick.init()
+            pygame.font.init()
+        if audio is None:
+            audio = not self.headless
+        if audio:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.music.load('a_theme_for_space.mp3')
+            self.audio = ChannelPool(max_audio_channels)
 
     def track(self, entity):
         self.tracked_entity = entity
 
     def add_entity(self, entity):
         self.entities.append(entity)
+        if self.force_breakdown:
+            for component in entity.components:
+                component.enable_force_breakdown()
+        (self.static_entities if entity.fixed else self.dynamic_entities).append(entity)
+
+    def add_controller_bank(self, bank):
+        self.controller_banks.append(bank)
+        return bank
+
+    def set_force_breakdown(self, enabled=True):
+        self.force_breakdown = enabled
+        for entity in self.entities:
+            for component in entity.components:
+                component.enable_force_breakdown(enabled)
+
+    def add_controller(self, controller):
+        self.controllers.append(controller)
+        return controller
+
+    def snapshot(self):
+        return SimulationSnapshot.take(self)
+
+    def restore(self, snapshot):
+        snapshot.restore(self)
+
+    def update_entity_sets(self):
+        # call after changing the fixed flag of an entity
+        self.static_entities = [entity for entity in self.entities if entity.fixed]
+        self.dynamic_entities = [entity for entity in self.entities if not entity.fixed]
 
     def position_from_physical(self, vec: Vector):
         return (vec - self.camera_center) * self.scale + Vector(self.window_size[0], self.window_size[1]) / 2
 
+    def get_screen_transform(self):
+        # affine transform from global coordinates to window pixels
+        key = (self.scale, self.camera_center.x, self.camera_center.y, self.window_size[0], self.window_size[1])
+        if key != self._screen_transform_key:
+            self._screen_transform = np.array(((self.scale, 0, self.window_size[0] / 2 - self.scale * self.camera_center.x),
+                                               (0, self.scale, self.window_size[1] / 2 - self.scale * self.camera_center.y),
+                                               (0, 0, 1)))
+            self._screen_transform_key = key
+        return self._screen_transform
+
+    def is_visible(self, position: Vector, radius):
+        # whether a circle in global coordinates overlaps the window
+        half_width = self.window_size[0] / 2 / self.scale + radius
+        half_height = self.window_size[1] / 2 / self.scale + radius
+        return abs(position.x - self.camera_center.x) <= half_width and abs(position.y - self.camera_center.y) <= half_height
+
     def polygon_from_physical(self, pts: []):
         return [self.position_from_physical(pt) for pt in pts]
 
@@ -37,66 +142,305 @@ class Simulator:
         if self.scale > self.scale_min:
             self.scale /= factor
 
+    def get_integrated_entities(self):
+        return [entity for entity in self.dynamic_entities if not entity.is_crashed and not entity.is_sleeping]
+
+    def prepare_step(self):
+        # control inputs and propulsion, evaluated once per step
+        for entity in self.dynamic_entities:
+            if entity.is_sleeping:
+                entity.prepare_sleeping_step()
+            elif self.profiler.enabled:
+                for component in entity.components:
+                    start = self.profiler.start()
+                    component.prepare_step()
+                    self.profiler.stop('control/' + type(component).__name__, start)
+            else:
+                for component in entity.components:
+                    component.prepare_step()
+
+    def compute_interactions(self):
+        # gravitational, aerodynamic and contact forces for the current state of all entities
+        # fixed and sleeping entities keep their forces
+        start = self.profiler.start()
+        awake_entities = [entity for entity in self.dynamic_entities if not entity.is_sleeping]
+        for entity in awake_entities:
+            for component in entity.components:
+                component._reset_interaction_forces()
+        if self.interaction_engine:
+            self.interaction_engine.update(self)
+        else:
+            for entity in awake_entities:
+                for component in entity.components:
+                    component._compute_interactions(self)
+        self.profiler.stop('interactions', start)
+
+    def step(self, time_step):
+        # compute all forces on a consistent state first, then integrate
+        profiler = self.profiler
+        step_start = profiler.start()
+        start = profiler.start()
+        if self.input_source:
+            self.input = self.input_source.sample(self, time_step)
+        for bank in self.controller_banks:
+            bank.update(time_step)
+        self.prepare_step()
+        profiler.stop('step/control', start)
+        warped_time = 0
+        if self.time_warp > 1:
+            start = profiler.start()
+            duration = time_step * self.time_warp + self.warp_remainder
+            warped_time, reason = self.on_rails.step(self, duration)
+            profiler.stop('step/on_rails', start)
+            if reason in ('ineligible', 'boundary'):
+                self.time_warp = 1  # thrust, contact, atmosphere or an approach ahead, integrate numerically
+                self.warp_remainder = 0
+            else:
+                self.warp_remainder = duration - warped_time
+        else:
+            self.warp_remainder = 0
+        if warped_time:
+            profiler.count('warped_steps')
+        else:
+            start = profiler.start()
+            self.integrator.step(self, time_step)  # includes the interaction force evaluations
+            profiler.stop('step/integrator', start)
+            if self.allow_sleep:
+                for entity in self.get_integrated_entities():
+                    entity.update_sleep(time_step, self.sleep_velocity, self.sleep_velocity_angular, self.sleep_time)
+                profiler.count('sleeping_entities', sum(entity.is_sleeping for entity in self.dynamic_entities))
+        self.time += warped_time or time_step
+        if self.recorder:
+            start = profiler.start()
+            self.recorder.record(self)
+            profiler.stop('step/recorder', start)
+        profiler.stop('step', step_start)
+        profiler.count('steps')
+        profiler.count_allocations()
+
+    def advance(self, t_end, time_step):
+        while self.time < t_end - 1e-12:
+            # warped steps, including the remainder carried over, end at t_end too
+            step = min(time_step, (t_end - self.time) / self.time_warp)
+            self.warp_remainder = max(min(self.warp_remainder, t_end - self.time - step * self.time_warp), 0)
+            self.step(step)
+
+    def draw(self, entities=None):
+        # draws entities, by default the simulated ones
+        start = self.profiler.start()
+        self.window.fill((0, 0, 0))
+        for entity in self.entities if entities is None else entities:
+            entity.draw(self)  # culled and reduced in detail by the entity
+        if self.trajectory_predictor and self.tracked_entity:
+            self.trajectory_predictor.draw(self)
+        pygame.draw.circle(self.window, (255, 120, 0),
+                           self.position_from_physical(Vector()).get(),
+                           self.scale * 0.05)
+        self.profiler.stop('draw', start)
+        self.profiler.count('frames')
+        if self.profiler.enabled and self.show_profiler_overlay:
+            if self._profiler_font is None:
+                pygame.font.init()
+                self._profiler_font = pygame.font.SysFont('monospace', 14)
+            self.profiler.draw_overlay(self.window, self._profiler_font)
+
+    def _update_camera(self, tracked_entity=None):
+        # follows tracked_entity, the drawn copy of the tracked entity while running
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_PERIOD] or (self.joystick and self.joystick.get_button(4)):
+            self.zoom_out()
+
+        if keys[pygame.K_COMMA] or (self.joystick and self.joystick.get_button(9)):
+            self.zoom_in()
+
+        if keys[pygame.K_a]:
+            self.auto_scale = True
+
+        if keys[pygame.K_m]:
+            self.auto_scale = False
+
+        if keys[pygame.K_p]:
+            self.show_profiler_overlay = self.profiler.enabled
 
-    def run(self, fps=60):
+        if keys[pygame.K_o]:
+            self.show_profiler_overlay = False
+
+        if keys[pygame.K_UP]:
+            self.camera_center -= Vector(0, 1) / self.scale * 5
+
+        if keys[pygame.K_DOWN]:
+            self.camera_center += Vector(0, 1) / self.scale * 5
+
+        if keys[pygame.K_LEFT]:
+            self.camera_center -= Vector(1, 0) / self.scale * 5
+
+        if keys[pygame.K_RIGHT]:
+            self.camera_center += Vector(1, 0) / self.scale * 5
+
+        tracked_entity = tracked_entity or self.tracked_entity
+        if tracked_entity:
+            self.camera_center = tracked_entity.position_of_center_of_gravity.copy()
+            if self.auto_scale:
+                self.scale = min(self.scale_max / tracked_entity.velocity.norm()/10, self.scale_max/10)
+            if tracked_entity.is_crashed:
+                pygame.font.init()  # you have to call this at the start,
+                # if you want to use this module.
+                myfont = pygame.font.SysFont('calibri', 50)
+                textsurface = myfont.render('You Crashed!', False, (50, 50, 50))
+                self.window.blit(textsurface, (self.window_size[0]/2-150, self.window_size[1]/6))
+                pygame.display.update()
+
+                pass
+
+    def _publish_state(self, wall_time):
+        # double buffer of what frames draw, the older one is dropped: entity states and crash flags,
+        # component orientations and thruster throttles
+        components = [component for entity in self.entities for component in entity.components]
+        frame = dict(state=np.array([entity.get_state() for entity in self.entities], dtype=float).reshape(-1, 6),
+                     is_crashed=[entity.is_crashed for entity in self.entities],
+                     orientation_in_entity=[component.orientation_in_entity for component in components],
+                     throttle=[getattr(component, 'throttle', None) for component in components])
+        self._published_states = (self._published_states[1], (wall_time, frame))
+
+    def _get_drawn_state(self, wall_time):
+        # published frame with the entity states one physics step in the past, interpolated between the two published frames
+        previous, current = self._published_states
+        if previous is None or len(previous[1]['state']) != len(current[1]['state']):
+            return None
+        alpha = np.clip((wall_time - previous[0]) / max(current[0] - previous[0], 1e-9), 0, 1)
+        return dict(current[1], state=previous[1]['state'] + (current[1]['state'] - previous[1]['state']) * alpha)
+
+    def _copy_entities(self):
+        # copies of the entities for drawing while physics steps the originals, sharing their input functions
+        memo = {id(component.input_functions): component.input_functions
+                for entity in self.entities for component in entity.components}
+        return copy.deepcopy(self.entities, memo)
+
+    @staticmethod
+    def _apply_drawn_state(entities, frame):
+        for entity, state, is_crashed in zip(entities, frame['state'], frame['is_crashed']):
+            if not entity.fixed:
+                entity.set_state(state)
+            entity.is_crashed = is_crashed
+        components = [component for entity in entities for component in entity.components]
+        for component, orientation, throttle in zip(components, frame['orientation_in_entity'], frame['throttle']):
+            component.orientation_in_entity = orientation
+            if throttle is not None:
+                component.throttle = throttle
+
+    def _run_physics(self, time_step, max_lag):
+        # fixed rate steps on the physics thread. Falling more than max_lag seconds behind, e.g. under
+        # a debugger, drops time instead of trying to catch up
+        try:
+            next_time = time.perf_counter()
+            while self._physics_running:
+                now = time.perf_counter()
+                next_time = max(next_time, now - max_lag)
+                if next_time <= now:
+                    self._physics_idle.clear()
+                while next_time <= now:
+                    with self._state_lock:
+                        self.step(time_step)
+                        self._publish_state(next_time)
+                    next_time += time_step
+                self._physics_idle.set()
+                time.sleep(max(0., next_time - time.perf_counter()))
+        except Exception as exception:
+            self._physics_error = exception
+            self._physics_idle.set()
+
+    def run(self, fps=60, physics_rate=240, max_lag=0.25):
+        # physics steps at physics_rate on its own thread, independent of the frame rate. Frames wait
+        # for physics to catch up, then draw copies of the entities set to the published state,
+        # interpolated one physics step in the past, without holding up physics. Input is passed to
+        # the physics thread through a queue
+        assert not self.headless, 'use step() or advance() on a headless simulator'
         # pygame.mixer.music.play(-1)  # If the loops is -1 then the music will repeat indefinitely.
-        self.joystick = pygame.joystick.Joystick(0)
-        self.joystick.init()
+        if pygame.joystick.get_count():
+            self.joystick = pygame.joystick.Joystick(0)
+            self.joystick.init()
+        if self.input_source is None:
+            self.input_source = QueuedInput()
+        live_input = LiveInput(self.joystick) if isinstance(self.input_source, QueuedInput) else None
+        self.window = pygame.display.set_mode((self.window_size[0], self.window_size[1]))
+        clock = pygame.time.Clock()
+        time_step = 1 / physics_rate
+
+        self._state_lock = threading.Lock()
+        self._published_states = (None, None)
+        self._publish_state(time.perf_counter())
+        self._physics_error = None
+        self._physics_idle = threading.Event()
+        drawn_entities = self._copy_entities()
+        self._physics_running = True
+        physics = threading.Thread(target=self._run_physics, args=(time_step, max_lag), daemon=True)
+        physics.start()
+        if self.trajectory_predictor:
+            self.trajectory_predictor.start()
+        try:
+            running = True
+            while running and self._physics_error is None:
+                clock.tick(fps)
+
+                for event in pygame.event.get():
+                    if live_input:
+                        live_input.handle_event(event)
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_RIGHTBRACKET:
+                        self.time_warp = min(self.time_warp * 10, self.max_time_warp)
+                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_LEFTBRACKET:
+                        self.time_warp = max(self.time_warp // 10, 1)
+                if live_input:
+                    self.input_source.put(live_input.sample(self, time_step))
+
+                self._physics_idle.wait(1 / fps)
+                with self._state_lock:
+                    if self.trajectory_predictor:
+                        self.trajectory_predictor.update(self)  # with the physics state, not the drawn one
+                    if len(drawn_entities) != len(self.entities):
+                        drawn_entities = self._copy_entities()
+                    tracked = self.entities.index(self.tracked_entity) if self.tracked_entity in self.entities else None
+                drawn_state = self._get_drawn_state(time.perf_counter() - time_step)
+                if drawn_state is not None and len(drawn_state['state']) == len(drawn_entities):
+                    self._apply_drawn_state(drawn_entities, drawn_state)
+                self._update_camera(None if tracked is None else drawn_entities[tracked])
+                if self.audio:
+                    self.audio.update(self, drawn_entities)
+                self.draw(drawn_entities)
+                pygame.display.update()
+        finally:
+            self._physics_running = False
+            physics.join()
+            if self.trajectory_predictor:
+                self.trajectory_predictor.stop()
+            if self.audio:
+                self.audio.stop()
+        if self._physics_error is not None:
+            raise self._physics_error
+
+    def replay(self, reader, fps=60, speed=1):
+        # draws a TrajectoryReader recording of this simulator's entities without simulating
+        assert not self.headless, 'replay needs a window'
         self.window = pygame.display.set_mode((self.window_size[0], self.window_size[1]))
         clock = pygame.time.Clock()
-        running = True
+        playback_time = reader[0]['time'] if len(reader) else 0
+        running = len(reader) > 0
         while running:
-            time_step = clock.tick(fps) / 1000
+            playback_time += clock.tick(fps) / 1000 * speed
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
 
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_PERIOD] or self.joystick.get_button(4):
-                self.zoom_out()
-
-            if keys[pygame.K_COMMA] or self.joystick.get_button(9):
-                self.zoom_in()
-
-            if keys[pygame.K_a]:
-                self.auto_scale = True
-
-            if keys[pygame.K_m]:
-                self.auto_scale = False
-
-            if keys[pygame.K_UP]:
-                self.camera_center -= Vector(0, 1) / self.scale * 5
-
-            if keys[pygame.K_DOWN]:
-                self.camera_center += Vector(0, 1) / self.scale * 5
-
-            if keys[pygame.K_LEFT]:
-                self.camera_center -= Vector(1, 0) / self.scale * 5
-
-            if keys[pygame.K_RIGHT]:
-                self.camera_center += Vector(1, 0) / self.scale * 5
-
-            if self.tracked_entity:
-                self.camera_center = self.tracked_entity.position_of_center_of_gravity
-                if self.auto_scale:
-                    self.scale = min(self.scale_max / self.tracked_entity.velocity.norm()/10, self.scale_max/10)
-                if self.tracked_entity.is_crashed:
-                    pygame.font.init()  # you have to call this at the start,
-                    # if you want to use this module.
-                    myfont = pygame.font.SysFont('calibri', 50)
-                    textsurface = myfont.render('You Crashed!', False, (50, 50, 50))
-                    self.window.blit(textsurface, (self.window_size[0]/2-150, self.window_size[1]/6))
-                    pygame.display.update()
-
-                    pass
-
-            self.window.fill((0, 0, 0))
-            for entity in self.entities:
-                # position_in_pygame = self.position_from_physical(entity.position_of_center_of_gravity)
-                # if (self.camera_center - position_in_pygame).norm() < 2 * max(self.window_size):
-                entity.update_and_draw(self, time_step)
-            pygame.draw.circle(self.window, (255, 120, 0),
-                               self.position_from_physical(Vector()).get(),
-                               self.scale * 0.05)
+            index = reader.get_index_at(playback_time)
+            reader.apply(self, index)
+            self._update_camera()
+            if self.audio:
+                self.audio.update(self)
+            self.draw()
             pygame.display.update()
+            if index == len(reader) - 1:
+                running = False
+        if self.audio:
+            self.audio.stop()
@@ -0,0 +1,220 @@
+import numpy as np
+from component_base import ComponentBase, GRAVITATIONAL_CONSTANT
+
+# field channels: gravitational acceleration (x, y), air velocity (x, y), atmosphere coverage
+CHANNELS = 5
+
+
+def get_point_mass_field(positions, center, mass):
+    # field values of a point mass: gravitational acceleration, no wind
+    values = np.zeros((len(positions), CHANNELS))
+    d_position = center - positions
+    distance_squared = d_position[:, 0]**2 + d_position[:, 1]**2
+    magnitude = GRAVITATIONAL_CONSTANT * mass / np.maximum(distance_squared, 1)
+    values[:, :2] = d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[:, None]
+    return values
+
+
+class FieldGrid:
+    # Field values on the nodes of a uniform grid, sampled by bilinear interpolation.
+    def __init__(self, origin, cell_size, cells, evaluate):
+        self.origin = np.asarray(origin, dtype=float)
+        self.cell_size = cell_size
+        self.cells = cells
+        x = self.origin[0] + np.arange(cells + 1) * cell_size
+        y = self.origin[1] + np.arange(cells + 1) * cell_size
+        nodes = np.stack(np.meshgrid(x, y, indexing='ij'), axis=-1).reshape(-1, 2)
+        self.values = evaluate(nodes).reshape(cells + 1, cells + 1, CHANNELS)
+
+    def contains(self, positions):
+        relative = (positions - self.origin) / self.cell_size
+        return np.all((relative >= 0) & (relative <= self.cells), axis=1)
+
+    def sample(self, positions):
+        relative = (positions - self.origin) / self.cell_size
+        index = np.clip(relative.astype(int), 0, self.cells - 1)
+        fraction = (relative - index)[:, :, None]
+        i, j = index[:, 0], index[:, 1]
+        bottom = self.values[i, j] * (1 - fraction[:, 0]) + self.values[i + 1, j] * fraction[:, 0]
+        top = self.values[i, j + 1] * (1 - fraction[:, 0]) + self.values[i + 1, j + 1] * fraction[:, 0]
+        return bottom * (1 - fraction[:, 1]) + top * fraction[:, 1]
+
+
+class StaticField:
+    # Combined gravity and wind of all fixed entities, precomputed on a coarse grid over the map and
+    # nested patches around every massive fixed component, with levels halving in size towards it.
+    # Patches store the field without the gravity of their own component, which is added back
+    # exactly when sampling, so only the smooth remainder is interpolated near surfaces.
+    # Positions outside every grid are evaluated exactly. The grids are rebuilt when fixed entities
+    # are added, removed, moved or change their mass; call invalidate() after other changes.
+    # Grid nodes are evaluated against all masses at once in chunks of at most chunk_size
+    # node-mass pairs; emitters are assumed to emit no wind beyond their extent. Patches are
+    # evaluated the first time a position falls into them, so patches nobody visits cost nothing.
+    def __init__(self, coarse_cells=256, patch_cells=32, margin=0.25, chunk_size=2**20):
+        self.coarse_cells = coarse_cells
+        self.patch_cells = patch_cells
+        self.margin = margin
+        self.chunk_size = chunk_size
+        self.coarse = None
+        self.patches = []  # FieldGrid, None until first sampled
+        self.patch_specs = []  # (origin, cell size, remainder) to build the patch from
+        self.patch_masses = []
+        self._key = None
+
+    def invalidate(self):
+        self._key = None
+
+    def update(self, entities):
+        fixed_entities = [entity for entity in entities if entity.fixed]
+        key = tuple((id(entity), entity.position_of_center_of_gravity.x, entity.position_of_center_of_gravity.y,
+                     entity.orientation, entity.mass_properties_version) for entity in fixed_entities)
+        if key != self._key:
+            self.build(fixed_entities)
+            self._key = key
+
+    def build(self, fixed_entities):
+        components = [component for entity in fixed_entities for component in entity.components]
+        massive = [component for component in components if component.mass]
+        self.mass_positions = np.array([component.get_global_position().get() for component in massive]).reshape(-1, 2)
+        self.mass_values = np.array([component.mass for component in massive], dtype=float)
+        # wind is linear in the receiver velocity for the emitters in the component library
+        self.emitters = [component for component in components
+                         if type(component).get_wind_emitted_at is not ComponentBase.get_wind_emitted_at]
+        self.emitter_positions = np.array([emitter.get_global_position().get() for emitter in self.emitters]).reshape(-1, 2)
+        self.emitter_extents = np.array([emitter.get_extent() for emitter in self.emitters], dtype=float)
+        self.coarse = None
+        self.patches = []
+        self.patch_specs = []
+        self.patch_masses = []
+        if not components:
+            return
+
+        centers = np.array([component.get_global_position().get() for component in components])
+        extents = np.array([component.get_extent() for component in components])
+        lower = np.min(centers - extents[:, None], axis=0)
+        upper = np.max(centers + extents[:, None], axis=0)
+        size = np.max(upper - lower) * (1 + 2 * self.margin) + 1
+        origin = (lower + upper) / 2 - size / 2
+        coarse = FieldGrid(origin, size / self.coarse_cells, self.coarse_cells, self.evaluate)
+
+        # patch level l around center c has half size patch_half_sizes[c] * 2**l and is patches[patch_offsets[c] + l]
+        self.patch_centers, self.patch_half_sizes, self.patch_levels, self.patch_offsets = [], [], [], []
+        for component in components:
+            if not component.mass:
+                continue
+            center = np.array(component.get_global_position().get())
+            extent = max(component.get_extent(), 1)
+            half_size = extent  # the finest level still covers the surface
+            self.patch_centers.append(center)
+            self.patch_half_sizes.append(half_size)
+            self.patch_offsets.append(len(self.patches))
+            remainder = lambda nodes, center=center, mass=component.mass: self.evaluate(nodes) - get_point_mass_field(nodes, center, mass)
+            while half_size <= 4 * extent or 2 * half_size / self.patch_cells < coarse.cell_size:
+                self.patches.append(None)
+                self.patch_specs.append((center - half_size, 2 * half_size / self.patch_cells, remainder))
+                self.patch_masses.append((center, component.mass))
+                half_size *= 2
+            self.patch_levels.append(len(self.patches) - self.patch_offsets[-1])
+        self.patch_centers = np.array(self.patch_centers).reshape(-1, 2)
+        self.patch_half_sizes = np.array(self.patch_half_sizes)
+        self.patch_levels = np.array(self.patch_levels, dtype=int)
+        self.patch_offsets = np.array(self.patch_offsets, dtype=int)
+        self.coarse = coarse
+
+    def evaluate(self, positions):
+        # exact field at global positions of shape (n, 2)
+        values = np.zeros((len(positions), CHANNELS))
+        if len(positions) == 0:
+            return values
+        chunk = max(self.chunk_size // max(len(self.mass_values), 1), 1)
+        for start in range(0, len(positions), chunk):
+            d_position = self.mass_positions[None] - positions[start:start + chunk, None]  # (nodes, masses, 2)
+            distance_squared = d_position[:, :, 0]**2 + d_position[:, :, 1]**2
+            magnitude = GRAVITATIONAL_CONSTANT * self.mass_values / np.maximum(distance_squared, 1)
+            values[start:start + chunk, :2] = np.einsum('nmk,nm->nk', d_position, magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))
+
+        # only emitters reaching the bounding box of the positions, evaluated where they reach
+        lower, upper = np.min(positions, axis=0), np.max(positions, axis=0)
+        nearest = np.clip(self.emitter_positions, lower, upper)
+        reaching = np.flatnonzero(np.sum((nearest - self.emitter_positions)**2, axis=1) < self.emitter_extents**2)
+        for e in reaching:
+            d_position = positions - self.emitter_positions[e]
+            inside = np.flatnonzero(d_position[:, 0]**2 + d_position[:, 1]**2 < self.emitter_extents[e]**2)
+            if len(inside) == 0:
+                continue
+            resting = np.zeros((len(inside), 2))
+            moving = np.zeros((len(inside), 2))
+            moving[:, 0] = 1
+            wind = self.emitters[e].get_wind_emitted_at(positions[inside], resting)
+            values[inside, 2:4] += wind
+            values[inside, 4] += wind[:, 0] - self.emitters[e].get_wind_emitted_at(positions[inside], moving)[:, 0]
+        return values
+
+    def _get_patch(self, index):
+        if self.patches[index] is None:
+            origin, cell_size, remainder = self.patch_specs[index]
+            self.patches[index] = FieldGrid(origin, cell_size, self.patch_cells, remainder)
+        return self.patches[index]
+
+    def _find_patches(self, positions):
+        # index of the finest patch containing each position, -1 where no patch does
+        n = len(positions)
+        if len(self.patches) == 0:
+            return np.full(n, -1)
+        distance = np.max(np.abs(positions[:, None, :] - self.patch_centers[None]), axis=2)  # (n, centers)
+        level = np.ceil(np.log2(np.maximum(distance / self.patch_half_sizes, 1))).astype(int)
+        cell_size = self.patch_half_sizes * 2.0 ** level
+        cell_size[level >= self.patch_levels] = np.inf
+        best = np.argmin(cell_size, axis=1)
+        rows = np.arange(n)
+        return np.where(np.isfinite(cell_size[rows, best]), self.patch_offsets[best] + level[rows, best], -1)
+
+    def sample(self, positions):
+        # interpolated field at global positions of shape (n, 2)
+        values = np.empty((len(positions), CHANNELS))
+        if self.coarse is None:
+            values[:] = 0
+            return values
+        patch_index = self._find_patches(positions)
+        for index in np.unique(patch_index):
+            selected = np.flatnonzero(patch_index == index)
+            if index >= 0:
+                values[selected] = self._get_patch(index).sample(positions[selected]) \
+                                   + get_point_mass_field(positions[selected], *self.patch_masses[index])
+                continue
+            inside = self.coarse.contains(positions[selected])
+            values[selected[inside]] = self.coarse.sample(positions[selected[inside]])
+            values[selected[~inside]] = self.evaluate(positions[selected[~inside]])
+        return values
+
+    def get_gravitational_acceleration(self, positions):
+        return self.sample(positions)[:, :2]
+
+    def get_wind(self, positions, velocities):
+        # wind relative to receivers at positions moving with velocities, zero outside all atmospheres
+        values = self.sample(positions)
+        return values[:, 2:4] - values[:, 4:5] * velocities
+
+
+if '__main__' == __name__:
+    import time
+    from entity_library import Planet
+    from vector import Vector
+    rng = np.random.default_rng(0)
+    planets = [Planet(position_init=Vector(*rng.uniform(-1000, 1000, 2)), radius=int(rng.integers(5, 50)), density=5,
+                      athmosphere_radius=100, max_wind=10) for _ in range(20)]
+    field = StaticField()
+    start = time.perf_counter()
+    field.update(planets)
+    print('built the coarse grid in {:.2f} s'.format(time.perf_counter() - start))
+    positions = rng.uniform(-1100, 1100, (100000, 2))
+    exact = field.evaluate(positions)
+    start = time.perf_counter()
+    field.sample(positions)
+    print('built {} of {} patches on first use in {:.2f} s'.format(sum(patch is not None for patch in field.patches),
+                                                                  len(field.patches), time.perf_counter() - start))
+    start = time.perf_counter()
+    sampled = field.sample(positions)
+    print('{:.0f} ns per sample'.format((time.perf_counter() - start) / len(positions) * 1e9))
+    error = np.linalg.norm(sampled[:, :2] - exact[:, :2], axis=1) / np.linalg.norm(exact[:, :2], axis=1)
+    print('gravity relative error: median {:.2e}, 99th percentile {:.2e}'.format(np.median(error), np.percentile(error, 99)))
@@ -0,0 +1,153 @@
+import csv
+import copy
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from simulator import Simulator
+from entity_library import *
+from pid_controller import PIDController
+
+
+class ScriptedController:
+    # Open-loop throttle schedule of (time, throttle) breakpoints, linearly interpolated,
+    # with a PID on the thrust vector that damps the angular velocity of the rocket.
+    def __init__(self, throttle_schedule=((0, 0),), k_proportional=0.5, k_integral=0, k_derivative=0):
+        self.throttle_schedule = tuple(throttle_schedule)
+        self.k_proportional = k_proportional
+        self.k_integral = k_integral
+        self.k_derivative = k_derivative
+
+    def attach(self, simulator, rocket):
+        self.simulator = simulator
+        self.rocket = rocket
+        self.pid = simulator.add_controller(PIDController(self.k_proportional, self.k_integral, self.k_derivative))
+
+    def throttle(self):
+        times, throttles = zip(*self.throttle_schedule)
+        return float(np.interp(self.simulator.time, times, throttles))
+
+    def vector(self):
+        return self.pid.get(-self.rocket.velocity_angular, 0)
+
+    def thruster_left(self):
+        return 0
+
+    def thruster_right(self):
+        return 0
+
+
+class Scenario:
+    # Picklable description of a single headless run. planets is a list of Planet keyword arguments
+    # or None to draw planet_count random planets from the seed. rocket holds Rocket keyword arguments
+    # and controller those of controller_class, which must provide attach() and the four input functions.
+    def __init__(self, planets=None, planet_count=4, spread=1000,
+                 rocket=None, controller_class=ScriptedController, controller=None,
+                 duration=30, time_step=0.01, seed=None):
+        self.planets = planets
+        self.planet_count = planet_count
+        self.spread = spread
+        self.rocket = dict(rocket or {})
+        self.controller_class = controller_class
+        self.controller = dict(controller or {})
+        self.duration = duration
+        self.time_step = time_step
+        self.seed = seed
+
+    def with_parameters(self, parameters):
+        # copy with overrides such as {'rocket.mass': 100, 'controller.k_proportional': 0.5, 'duration': 20}
+        scenario = copy.deepcopy(self)
+        for key, value in parameters.items():
+            if '.' in key:
+                group, name = key.split('.', 1)
+                getattr(scenario, group)[name] = value
+            else:
+                setattr(scenario, key, value)
+        return scenario
+
+    def build(self):
+        simulator = Simulator(headless=True, seed=self.seed)
+        planets = self.planets
+        if planets is None:
+            planets = random_planet_parameters(simulator.rng, count=self.planet_count, spread=self.spread)
+        for planet_parameters in planets:
+            simulator.add_entity(Planet(**planet_parameters))
+
+        controller = self.controller_class(**self.controller)
+        rocket = Rocket(throttle_fn=controller.throttle, vector_fn=controller.vector,
+                        thruster_left_fn=controller.thruster_left, thruster_right_fn=controller.thruster_right,
+                        **self.rocket)
+        controller.attach(simulator, rocket)
+        simulator.add_entity(rocket)
+        return simulator, rocket
+
+    def run(self):
+        simulator, rocket = self.build()
+        thrusters = [component for component in rocket.components if isinstance(component, Thruster)]
+        legs = [component for component in rocket.components if isinstance(component, LandingLeg)]
+
+        thrust_integral = 0
+        touchdown_speed = np.nan
+        in_contact = False
+        while simulator.time < self.duration and not rocket.is_crashed:
+            speed = rocket.velocity.norm()
+            simulator.step(self.time_step)
+            thrust_integral += sum(thruster.throttle * thruster.max_thrust for thruster in thrusters) * self.time_step
+            in_contact = any(leg.contact_count for leg in legs)
+            if in_contact and np.isnan(touchdown_speed):
+                touchdown_speed = speed
+            if in_contact and rocket.velocity.norm() < 1e-2 and abs(rocket.velocity_angular) < 1e-2:
+                break  # settled on its legs
+
+        return dict(crashed=rocket.is_crashed,
+                    landed=not rocket.is_crashed and in_contact,
+                    touchdown_speed=touchdown_speed,
+                    thrust_integral=float(thrust_integral),
+                    time=simulator.time,
+                    position_x=rocket.position_of_center_of_gravity.x,
+                    position_y=rocket.position_of_center_of_gravity.y)
+
+
+def grid(parameters):
+    # all combinations of {'rocket.mass': [50, 100], ...}
+    keys = list(parameters)
+    return [dict(zip(keys, values)) for values in itertools.product(*parameters.values())]
+
+def sample(count, distributions, seed=None):
+    # count parameter sets, each value drawn by a callable taking a numpy Generator,
+    # e.g. {'controller.k_proportional': lambda rng: rng.uniform(0, 1)}
+    rng = np.random.default_rng(seed)
+    return [{key: distribution(rng) for key, distribution in distributions.items()} for _ in range(count)]
+
+def _run_scenario(scenario):
+    return scenario.run()
+
+def run_sweep(scenario, parameter_sets, seed=0, max_workers=None, chunksize=1):
+    # runs the scenario once per parameter set across a process pool. Each run gets its own seed
+    # spawned from seed unless the parameter set fixes one. Rows keep the order of parameter_sets.
+    seeds = np.random.SeedSequence(seed).spawn(len(parameter_sets))
+    scenarios = [scenario.with_parameters({'seed': int(run_seed.generate_state(1)[0]), **parameters})
+                 for parameters, run_seed in zip(parameter_sets, seeds)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        outcomes = list(executor.map(_run_scenario, scenarios, chunksize=chunksize))
+    return [{'run': i, 'seed': run.seed, **parameters, **outcome}
+            for i, (run, parameters, outcome) in enumerate(zip(scenarios, parameter_sets, outcomes))]
+
+def save_results(results, path):
+    fieldnames = list(dict.fromkeys(key for row in results for key in row))
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if '__main__' == __name__:
+    scenario = Scenario(planets=[dict(position_init=Vector(0, 100), radius=100, density=5, athmosphere_radius=200)],
+                        rocket=dict(position_init=Vector(0, -20), orientation_init=np.pi, mass=100, max_thrust=250,
+                                    max_thrust_thrusters=100, height=2, diameter=0.3, rel_height_pressure_center=0.2),
+                        duration=20)
+    parameter_sets = grid({'controller.throttle_schedule': [((0, 0), (2, 0), (2.1, 1)), ((0, 0), (3, 0), (3.1, 1))],
+                           'controller.k_proportional': [0.1, 0.5, 1]})
+    results = run_sweep(scenario, parameter_sets)
+    for row in results:
+        print(row)
+    save_results(results, 'sweep_results.csv')
@@ -0,0 +1,123 @@
+import math
+import numpy as np
+from component_base import ComponentBase, GRAVITATIONAL_CONSTANT
+from kepler import propagate
+
+
+class OnRails:
+    # Analytic propagation of coasting entities for warped steps. Every fixed entity with mass is a
+    # planet with a sphere of influence, the Laplace radius relative to the heavier planet pulling
+    # hardest on it, unbounded for the heaviest one. An entity on rails follows a two-body orbit
+    # around the planet with the smallest sphere of influence containing it and is handed over
+    # when it crosses into another one (patched conics). Other planets, wind and contact are
+    # ignored, so entities only go on rails without propulsion or contact, outside every
+    # atmosphere and more than approach_distance away from every collider and other entity.
+    # Substeps are as long as the entity certainly stays clear of all these boundaries, so the
+    # cost does not grow with the warped time. A step ends early with the reason 'boundary' when
+    # an entity reaches an atmosphere, collider or other entity, or 'substeps' when an entity used
+    # up max_substeps; it is not taken at all with 'ineligible' when an entity cannot go on rails.
+    def __init__(self, approach_distance=10, tolerance=1e-3, max_substeps=1000):
+        self.approach_distance = approach_distance
+        self.tolerance = tolerance
+        self.max_substeps = max_substeps
+
+    def get_planets(self, simulator):
+        planets = [entity for entity in simulator.static_entities if entity.get_total_mass() > 0]
+        centers = np.array([planet.position_of_center_of_gravity.get() for planet in planets]).reshape(-1, 2)
+        masses = np.array([planet.get_total_mass() for planet in planets], dtype=float)
+        # radius of the region that needs numerical integration: atmospheres and colliders plus the approach distance
+        radii = np.array([max([component.get_extent() for component in planet.components
+                               if type(component).get_wind_emitted_at is not ComponentBase.get_wind_emitted_at]
+                              + [component.bounding_radius + self.approach_distance for component in planet.components
+                                 if component.bounding_radius], default=0)
+                          for planet in planets], dtype=float)
+        spheres_of_influence = np.full(len(planets), np.inf)
+        for j in range(len(planets)):
+            heavier = np.flatnonzero((masses > masses[j]) | ((masses == masses[j]) & (np.arange(len(planets)) < j)))
+            if len(heavier):
+                distance = np.sqrt(np.sum((centers[heavier] - centers[j])**2, axis=1))
+                i = np.argmax(masses[heavier] / distance**2)
+                spheres_of_influence[j] = distance[i] * (masses[j] / masses[heavier[i]])**0.4
+        return centers, GRAVITATIONAL_CONSTANT * masses, radii, spheres_of_influence
+
+    def can_warp(self, entity, entities, planets):
+        if entity.is_crashed or entity.fixed or entity.is_sleeping:
+            return False
+        if any(component.propulsion_force.x or component.propulsion_force.y or component.contact_count
+               for component in entity.components):
+            return False
+        centers, _, radii, _ = planets
+        position = np.array(entity.position_of_center_of_gravity.get())
+        radius = entity.get_bounding_radius()
+        if np.any(np.sqrt(np.sum((centers - position)**2, axis=1)) - radii - radius <= self.tolerance):
+            return False
+        return all(entity.get_distance_to(other) > radius + other.get_bounding_radius() + self.approach_distance
+                   for other in entities if other is not entity)
+
+    def advance(self, position, velocity, duration, planets, radius=0):
+        # (position, velocity, time reached, reason) after at most duration, reason None if it was reached
+        centers, mus, radii, spheres_of_influence = planets
+        position, velocity = np.array(position, dtype=float), np.array(velocity, dtype=float)
+        time = 0
+        for _ in range(self.max_substeps):
+            if time >= duration:
+                return position, velocity, duration, None
+            distance = np.sqrt(np.sum((centers - position)**2, axis=1))
+            forbidden = np.min(distance - radii - radius)
+            if forbidden <= self.tolerance:
+                return position, velocity, time, 'boundary'
+            primary = np.argmin(np.where(distance < spheres_of_influence, spheres_of_influence, np.inf))
+            boundaries = np.abs(distance - spheres_of_influence)
+            # a boundary just reached is crossed in small steps
+            clearance = min(forbidden, np.min(np.where(boundaries > self.tolerance, boundaries, 4 * self.tolerance)))
+
+            relative_position = position - centers[primary]
+            mu = mus[primary]
+            energy = velocity.dot(velocity) / 2 - mu / math.hypot(*relative_position)
+            # fastest possible speed within the clearance of the current position
+            closest = max(math.hypot(*relative_position) - clearance, 1e-9)
+            speed = math.sqrt(max(2 * (energy + mu / closest), 0))
+            substep = min(duration - time, clearance / speed) if speed > 0 else duration - time
+            relative_position, velocity = propagate(relative_position, velocity, mu, substep)
+            position = centers[primary] + relative_position
+            time = duration if substep == duration - time else time + substep
+        if time >= duration:
+            return position, velocity, duration, None
+        return position, velocity, time, 'substeps'
+
+    def step(self, simulator, duration):
+        # advances all integrated entities by duration or until the first of them ends early,
+        # returns the time advanced and the reason of the earliest end, None if duration was reached
+        entities = simulator.get_integrated_entities()
+        planets = self.get_planets(simulator)
+        if not entities or len(planets[0]) == 0 or not all(self.can_warp(entity, entities, planets) for entity in entities):
+            return 0, 'ineligible'
+        starts = [(entity.position_of_center_of_gravity.get(), entity.velocity.get(), entity.get_bounding_radius())
+                  for entity in entities]
+        results = [self.advance(position, velocity, duration, planets, radius) for position, velocity, radius in starts]
+        reached, reason = min(((time, reason) for _, _, time, reason in results), key=lambda result: result[0])
+        if reached < duration:
+            results = [self.advance(position, velocity, reached, planets, radius) for position, velocity, radius in starts]
+        for entity, (position, velocity, _, _) in zip(entities, results):
+            entity.set_state((position[0], position[1], entity.orientation + entity.velocity_angular * reached,
+                              velocity[0], velocity[1], entity.velocity_angular))
+        return reached, reason
+
+
+if '__main__' == __name__:
+    import time
+    from simulator import Simulator
+    from entity_library import Planet, Rocket
+    from vector import Vector
+    for time_warp in (1, 1000):
+        simulator = Simulator(headless=True, seed=0, allow_sleep=False)
+        simulator.add_entity(planet := Planet(position_init=Vector(0, 0), radius=100, density=5, athmosphere_radius=150))
+        simulator.add_entity(rocket := Rocket(position_init=Vector(0, -400), mass=100, max_thrust=250, max_thrust_thrusters=100,
+                                              height=2, diameter=0.3, rel_height_pressure_center=0.2,
+                                              throttle_fn=lambda: 0, vector_fn=lambda: 0))
+        rocket.velocity = Vector(1.1 * math.sqrt(GRAVITATIONAL_CONSTANT * planet.get_total_mass() / 400), 0)
+        simulator.time_warp = time_warp
+        start = time.perf_counter()
+        simulator.advance(100, 0.001)
+        print('time warp {:4d}: position {}, {:.2f} s'.format(time_warp, np.round(rocket.position_of_center_of_gravity.get(), 2),
+                                                             time.perf_counter() - start))
@@ -0,0 +1,160 @@
+import threading
+import time
+import numpy as np
+import pygame
+from component_base import GRAVITATIONAL_CONSTANT
+
+
+class TrajectoryPredictor:
+    # Future path of one entity as a point mass under the gravity of all other entities, without
+    # thrust, wind or contact. Other entities move on straight lines from their state when the
+    # prediction was started. The path ends at the horizon or where it enters a collider.
+    # Every update() keeps the points ahead of the entity as long as the entity and the other
+    # entities still follow the prediction within tolerance, so normally only the tail is extended.
+    # The worker thread extends the path in slices of at most budget seconds with pauses in between.
+    def __init__(self, horizon=30, time_step=0.02, tolerance=1e-2, budget=1e-3, pause=4e-3, color=(120, 120, 120)):
+        self.horizon = horizon
+        self.time_step = time_step
+        self.tolerance = tolerance
+        self.budget = budget
+        self.pause = pause
+        self.color = color
+        self.entity = None
+        self.generation = 0  # counts restarts, slices computed for an older prediction are dropped
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._clear()
+
+    def _clear(self):
+        self.generation += 1
+        self.sources = (0, np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0), np.zeros(0))
+        self.times = np.zeros(0)
+        self.positions = np.zeros((0, 2))
+        self.velocities = np.zeros((0, 2))
+        self.hit = False  # the path ends in a collider
+
+    def _start_prediction(self, simulator, entity):
+        components = [component for other in simulator.entities if other is not entity for component in other.components]
+        self.entity = entity
+        self.generation += 1
+        # (time, positions, velocities, masses, collider radii) of the components of all other entities
+        self.sources = (simulator.time,
+                        np.array([component.get_global_position().get() for component in components]).reshape(-1, 2),
+                        np.array([component.entity.velocity.get() for component in components]).reshape(-1, 2),
+                        np.array([component.mass for component in components], dtype=float),
+                        np.array([component.bounding_radius or 0 for component in components], dtype=float))
+        self.times = np.array([simulator.time])
+        self.positions = np.array([entity.position_of_center_of_gravity.get()])
+        self.velocities = np.array([entity.velocity.get()])
+        self.hit = False
+
+    @staticmethod
+    def _get_source_positions(sources, time):
+        return sources[1] + sources[2] * (time - sources[0])
+
+    @staticmethod
+    def _get_acceleration(sources, position, time):
+        d_position = TrajectoryPredictor._get_source_positions(sources, time) - position
+        distance_squared = d_position[:, 0]**2 + d_position[:, 1]**2
+        magnitude = GRAVITATIONAL_CONSTANT * sources[3] / np.maximum(distance_squared, 1)
+        return np.sum(d_position * (magnitude / np.maximum(np.sqrt(distance_squared), 1e-3))[:, None], axis=0)
+
+    def _is_followed(self, simulator, entity):
+        # whether the entity and the other entities are still where the prediction expects them
+        if entity is not self.entity or len(self.times) == 0 or simulator.time < self.times[0]:
+            return False
+        k = int((simulator.time - self.times[0]) / self.time_step)
+        if k + 1 >= len(self.times):
+            return False
+        fraction = (simulator.time - self.times[k]) / self.time_step
+        position = self.positions[k] * (1 - fraction) + self.positions[k + 1] * fraction
+        velocity = self.velocities[k] * (1 - fraction) + self.velocities[k + 1] * fraction
+        if np.hypot(*(position - entity.position_of_center_of_gravity.get())) > self.tolerance \
+                or np.hypot(*(velocity - entity.velocity.get())) > self.tolerance:
+            return False
+        sources = [component.get_global_position().get() for other in simulator.entities if other is not entity
+                   for component in other.components]
+        return len(sources) == len(self.sources[1]) \
+               and np.all(np.abs(np.array(sources).reshape(-1, 2) - self._get_source_positions(self.sources, simulator.time)) <= self.tolerance)
+
+    def update(self, simulator, entity=None):
+        # call once per frame, with simulator.tracked_entity by default
+        entity = entity or simulator.tracked_entity
+        with self.lock:
+            if entity is None or entity.is_crashed:
+                self.entity = None
+                self._clear()
+                return
+            if self._is_followed(simulator, entity):
+                k = int((simulator.time - self.times[0]) / self.time_step)
+                self.times, self.positions, self.velocities = self.times[k:], self.positions[k:], self.velocities[k:]
+            else:
+                self._start_prediction(simulator, entity)
+        self._wake.set()
+
+    def extend(self, budget=None):
+        # integrates the path further by velocity Verlet for at most budget seconds, outside the lock,
+        # returns whether it is complete
+        start = time.perf_counter()
+        with self.lock:
+            if self.entity is None or self.hit:
+                return True
+            generation, sources = self.generation, self.sources
+            position, velocity, t = self.positions[-1], self.velocities[-1], self.times[-1]
+            end = self.times[0] + self.horizon
+        steps = []
+        hit = False
+        acceleration = self._get_acceleration(sources, position, t)
+        while not hit and t < end and (budget is None or time.perf_counter() - start < budget):
+            velocity_half = velocity + acceleration * self.time_step / 2
+            position = position + velocity_half * self.time_step
+            t += self.time_step
+            acceleration = self._get_acceleration(sources, position, t)
+            velocity = velocity_half + acceleration * self.time_step / 2
+            steps.append((t, position, velocity))
+            d_position = self._get_source_positions(sources, t) - position
+            hit = bool(np.any(d_position[:, 0]**2 + d_position[:, 1]**2 < sources[4]**2))
+        with self.lock:
+            if generation != self.generation:
+                return False  # restarted meanwhile
+            if steps:
+                times, positions, velocities = zip(*steps)
+                self.times = np.concatenate((self.times, times))
+                self.positions = np.concatenate((self.positions, positions))
+                self.velocities = np.concatenate((self.velocities, velocities))
+            self.hit = hit
+            return hit or t >= self.times[0] + self.horizon
+
+    def _run(self):
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            while self._running and not self.extend(self.budget):
+                time.sleep(self.pause)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            self._wake.set()
+            self._thread.join()
+
+    def get_points(self):
+        with self.lock:
+            return self.positions.copy()
+
+    def draw(self, simulator):
+        points = self.get_points()
+        if len(points) < 2:
+            return
+        transform = simulator.get_screen_transform()
+        points = points.dot(transform[:2, :2].T) + transform[:2, 2]
+        pygame.draw.lines(simulator.window, self.color, False, points.tolist())
+        if self.hit:
+            pygame.draw.circle(simulator.window, (255, 0, 0), points[-1].tolist(), 4, 1)
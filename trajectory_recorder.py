@@ -0,0 +1,132 @@
+import json
+import numpy as np
+
+# File layout: 8 byte magic, uint64 header length, uint64 frame count, JSON header describing the
+# entities and the record dtype, zero padding to a multiple of 64 bytes, then fixed-width records.
+MAGIC = b'SRTRAJ01'
+PREFIX_SIZE = 24
+ALIGNMENT = 64
+
+
+def _get_thrusters(simulator):
+    return [component for entity in simulator.entities for component in entity.components if hasattr(component, 'throttle')]
+
+def get_record_dtype(entity_count, thruster_count):
+    return np.dtype([('time', 'f8'),
+                     ('position', 'f8', (entity_count, 2)),
+                     ('velocity', 'f8', (entity_count, 2)),
+                     ('orientation', 'f8', (entity_count,)),
+                     ('velocity_angular', 'f8', (entity_count,)),
+                     ('is_crashed', '?', (entity_count,)),
+                     ('throttle', 'f8', (thruster_count,)),
+                     ('thruster_orientation', 'f8', (thruster_count,))])
+
+
+class TrajectoryRecorder:
+    # Appends one record per call to record() to a memory-mapped file that grows by chunk_frames records.
+    def __init__(self, path, simulator, chunk_frames=4096):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.entities = list(simulator.entities)
+        self.thrusters = _get_thrusters(simulator)
+        self.dtype = get_record_dtype(len(self.entities), len(self.thrusters))
+
+        header = dict(entities=[dict(name=entity.name, type=type(entity).__name__,
+                                     components=[type(component).__name__ for component in entity.components])
+                                for entity in self.entities],
+                      thrusters=[[self.entities.index(thruster.entity), thruster.entity.components.index(thruster)]
+                                 for thruster in self.thrusters],
+                      dtype=self.dtype.descr)
+        header = json.dumps(header).encode()
+        self.offset = -(-(PREFIX_SIZE + len(header)) // ALIGNMENT) * ALIGNMENT
+
+        self.file = open(path, 'w+b')
+        self.file.write(MAGIC)
+        self.file.write(np.array((len(header), 0), dtype='<u8').tobytes())
+        self.file.write(header)
+        self.file.truncate(self.offset)
+        self.count = 0
+        self.capacity = 0
+        self.frames = None
+        self._grow()
+
+    def _grow(self):
+        if self.frames is not None:
+            self.frames.flush()
+        self.capacity += self.chunk_frames
+        self.file.truncate(self.offset + self.capacity * self.dtype.itemsize)
+        self.frames = np.memmap(self.file, dtype=self.dtype, mode='r+', offset=self.offset, shape=(self.capacity,))
+
+    def record(self, simulator):
+        if self.count == self.capacity:
+            self._grow()
+        frame = self.frames[self.count]
+        frame['time'] = simulator.time
+        for k, entity in enumerate(self.entities):
+            frame['position'][k] = entity.position_of_center_of_gravity.get()
+            frame['velocity'][k] = entity.velocity.get()
+            frame['orientation'][k] = entity.orientation
+            frame['velocity_angular'][k] = entity.velocity_angular
+            frame['is_crashed'][k] = entity.is_crashed
+        for k, thruster in enumerate(self.thrusters):
+            frame['throttle'][k] = thruster.throttle
+            frame['thruster_orientation'][k] = thruster.orientation_in_entity
+        self.count += 1
+
+    def flush(self):
+        self.frames.flush()
+        self.file.seek(16)
+        self.file.write(np.array(self.count, dtype='<u8').tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.frames = None
+        self.file.truncate(self.offset + self.count * self.dtype.itemsize)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+    # Zero-copy access to a recording: indexing returns numpy structured records backed by the file.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            assert file.read(8) == MAGIC, '{} is not a trajectory recording'.format(path)
+            header_length, self.count = np.frombuffer(file.read(16), dtype='<u8')
+            self.header = json.loads(file.read(int(header_length)))
+        self.dtype = np.dtype([tuple(field) for field in self.header['dtype']])
+        self.offset = -(-(PREFIX_SIZE + int(header_length)) // ALIGNMENT) * ALIGNMENT
+        self.frames = np.memmap(path, dtype=self.dtype, mode='r', offset=self.offset, shape=(int(self.count),))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, key):
+        return self.frames[key]
+
+    def iter_chunks(self, chunk_frames=1024):
+        for start in range(0, len(self.frames), chunk_frames):
+            yield self.frames[start:start + chunk_frames]
+
+    def get_index_at(self, time):
+        # last frame recorded at or before time
+        return max(int(np.searchsorted(self.frames['time'], time, side='right')) - 1, 0)
+
+    def apply(self, simulator, index):
+        # sets the state of the simulator entities, which must match the recorded ones, to a frame
+        frame = self.frames[index]
+        assert len(simulator.entities) == len(self.header['entities']), 'simulator does not match the recording'
+        for k, entity in enumerate(simulator.entities):
+            entity.set_state((*frame['position'][k], frame['orientation'][k], *frame['velocity'][k], frame['velocity_angular'][k]))
+            entity.is_crashed = bool(frame['is_crashed'][k])
+        for k, (entity_index, component_index) in enumerate(self.header['thrusters']):
+            thruster = simulator.entities[entity_index].components[component_index]
+            thruster.throttle = float(frame['throttle'][k])
+            thruster.orientation_in_entity = float(frame['thruster_orientation'][k])
+        simulator.time = float(frame['time'])
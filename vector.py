@@ -1,61 +1,175 @@
+import math
 import numpy as np
 
 class Vector():
+    __slots__ = ('x', 'y')
+
     def __init__(self, x=0, y=0):
-        self.data = np.array((x, y), dtype=float)
+        self.x = float(x)
+        self.y = float(y)
 
     @classmethod
     def from_polar(cls, length, angle):
-        vec_x = -length * np.sin(angle)
-        vec_y = length * np.cos(angle)
+        vec_x = -length * math.sin(angle)
+        vec_y = length * math.cos(angle)
         return cls(vec_x, vec_y)
 
+    @property
+    def data(self):
+        return np.array((self.x, self.y))
+
+    def copy(self):
+        return Vector(self.x, self.y)
+
     def rotate(self, angle):
-        R = np.array(((np.cos(angle), -np.sin(angle)),
-                      (np.sin(angle), np.cos(angle))))
-        new_vec = R.dot(self.data)
-        return Vector(new_vec[0], new_vec[1])
+        return self.rotate_by(math.cos(angle), math.sin(angle))
+
+    def rotate_by(self, cos, sin):
+        # rotation with precomputed cos and sin of the angle
+        return Vector(cos * self.x - sin * self.y, sin * self.x + cos * self.y)
 
     def dot(self, other):
-        return self.data[0] * other.data[0] + self.data[1] * other.data[1]
+        return self.x * other.x + self.y * other.y
 
     def get_angle(self):
-        return np.arctan2(self.data[1], self.data[0])
+        return math.atan2(self.y, self.x)
 
     def norm(self):
-        return np.sqrt(self.data[0]**2 + self.data[1]**2)
+        return math.sqrt(self.x**2 + self.y**2)
 
     def unit_length(self):
         return self / max(self.norm(), 1e-3)
 
     def get(self):
-        return (self.data[0], self.data[1])
+        return (self.x, self.y)
 
     def __getitem__(self, key):
-        return self.data[key]
+        return (self.x, self.y)[key]
 
     def __str__(self):
         return str(self.data)
 
     def __neg__(self):
-        return Vector(-self.data[0], -self.data[1])
+        return Vector(-self.x, -self.y)
 
     def __add__(self, other):
-        data_new = self.data + other.data
-        return Vector(data_new[0], data_new[1])
+        return Vector(self.x + other.x, self.y + other.y)
 
     def __sub__(self, other):
-        data_new = self.data - other.data
-        return Vector(data_new[0], data_new[1])
+        return Vector(self.x - other.x, self.y - other.y)
 
     def __mul__(self, other: float):
-        return Vector(self.data[0] * other, self.data[1] * other)
+        return Vector(self.x * other, self.y * other)
 
     def __truediv__(self, other: float):
-        return Vector(self.data[0] / other, self.data[1] / other)
+        return Vector(self.x / other, self.y / other)
+
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, other: float):
+        self.x *= other
+        self.y *= other
+        return self
+
+    def __itruediv__(self, other: float):
+        self.x /= other
+        self.y /= other
+        return self
+
+
+class VectorArray():
+    # batch of vectors stored as one (n, 2) array
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=float).reshape(-1, 2)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        return cls([vector.get() for vector in vectors])
+
+    @classmethod
+    def from_polar(cls, lengths, angles):
+        return cls(np.stack((-lengths * np.sin(angles), lengths * np.cos(angles)), axis=-1))
+
+    def to_vectors(self):
+        return [Vector(x, y) for x, y in self.data]
+
+    def rotate(self, angles):
+        # rotates all vectors by one angle or by one angle per vector
+        cos, sin = np.cos(angles), np.sin(angles)
+        return VectorArray(np.stack((cos * self.data[:, 0] - sin * self.data[:, 1],
+                                     sin * self.data[:, 0] + cos * self.data[:, 1]), axis=-1))
+
+    def dot(self, other):
+        return np.sum(self.data * other.data, axis=1)
+
+    def get_angle(self):
+        return np.arctan2(self.data[:, 1], self.data[:, 0])
+
+    def norm(self):
+        return np.sqrt(self.data[:, 0]**2 + self.data[:, 1]**2)
+
+    def unit_length(self):
+        return VectorArray(self.data / np.maximum(self.norm(), 1e-3)[:, None])
+
+    def get(self):
+        return self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return Vector(self.data[key, 0], self.data[key, 1])
+
+    def __neg__(self):
+        return VectorArray(-self.data)
+
+    def __add__(self, other):
+        return VectorArray(self.data + _as_array(other))
+
+    def __sub__(self, other):
+        return VectorArray(self.data - _as_array(other))
+
+    def __mul__(self, other):
+        return VectorArray(self.data * _as_factor(other))
+
+    def __truediv__(self, other):
+        return VectorArray(self.data / _as_factor(other))
+
+    def __iadd__(self, other):
+        self.data += _as_array(other)
+        return self
+
+    def __isub__(self, other):
+        self.data -= _as_array(other)
+        return self
+
+    def __imul__(self, other):
+        self.data *= _as_factor(other)
+        return self
+
+
+def _as_array(other):
+    if isinstance(other, Vector):
+        return np.array(other.get())
+    if isinstance(other, VectorArray):
+        return other.data
+    return other
+
+def _as_factor(other):
+    # scalars scale all vectors, arrays of length n scale each vector
+    other = np.asarray(other, dtype=float)
+    return other[:, None] if other.ndim == 1 else other
 
 
 if __name__ == '__main__':
     v1 = Vector(1, 2)
     v2 = Vector(1, 1)
-    print(v1.dot(v2))
\ No newline at end of file
+    print(v1.dot(v2))